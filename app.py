@@ -4,8 +4,10 @@ Reading Comprehension Tool - Web Interface
 Streamlit-based visual interface
 """
 
+import contextlib
 import sys
 import os
+import uuid
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 import streamlit as st
@@ -14,8 +16,10 @@ from reading_passages import PassageDatabase
 from questions import QuestionBank
 from evaluator import Evaluator
 from progress_tracker import ProgressTracker
+from progress_store import ProgressStore
 from api_config import APIConfig
 from tts_helper import TTSHelper
+import search_index
 
 # Page configuration
 st.set_page_config(
@@ -107,7 +111,7 @@ st.markdown("""
 
 # Initialize session state
 if 'tracker' not in st.session_state:
-    st.session_state.tracker = ProgressTracker()
+    st.session_state.tracker = ProgressTracker(write_behind=True)
 if 'evaluator' not in st.session_state:
     st.session_state.evaluator = Evaluator()
 if 'current_passage' not in st.session_state:
@@ -118,8 +122,25 @@ if 'answers' not in st.session_state:
     st.session_state.answers = {}
 if 'show_results' not in st.session_state:
     st.session_state.show_results = False
+if 'attempt_token' not in st.session_state:
+    st.session_state.attempt_token = None
+if 'results' not in st.session_state:
+    st.session_state.results = None
 if 'selected_grade' not in st.session_state:
     st.session_state.selected_grade = None
+if 'student_id' not in st.session_state:
+    st.session_state.student_id = ''
+
+@st.cache_resource
+def get_progress_store():
+    """Process-wide store of per-student progress, shared by all sessions"""
+    return ProgressStore(write_behind=True)
+
+def current_tracker():
+    """Hold the progress tracker for the student using this session"""
+    if st.session_state.student_id:
+        return get_progress_store().open_tracker(st.session_state.student_id)
+    return contextlib.nullcontext(st.session_state.tracker)
 
 def main():
     """Main application"""
@@ -133,18 +154,67 @@ def main():
     st.sidebar.markdown("**Choose what you want to do:**")
     page = st.sidebar.radio(
         "",
-        ["🏠 Home", "📚 Read a Story", "⭐ My Progress", "❓ Help"]
+        ["🏠 Home", "📚 Read a Story", "⭐ My Progress", "🍎 Teacher Dashboard", "❓ Help"]
     )
 
+    # Optional student ID for classroom installs
+    student_id = st.sidebar.text_input(
+        "👤 Student ID (optional)",
+        value=st.session_state.student_id,
+        help="Classrooms can give each student an ID to keep their progress separate"
+    ).strip()
+    if student_id and not ProgressStore.STUDENT_ID_PATTERN.match(student_id):
+        st.sidebar.error("Use letters, numbers, '.', '_' or '-' for the student ID.")
+    else:
+        st.session_state.student_id = student_id
+
+    show_sidebar_search()
+
     if page == "🏠 Home":
         show_home()
     elif page == "📚 Read a Story":
         show_reading_practice()
     elif page == "⭐ My Progress":
         show_progress()
+    elif page == "🍎 Teacher Dashboard":
+        show_teacher_dashboard()
     elif page == "❓ Help":
         show_help()
 
+def show_sidebar_search():
+    """Search passages and questions from the sidebar"""
+    with st.sidebar.expander("🔎 Find a Story", expanded=False):
+        query = st.text_input("Topic or words", placeholder="e.g. water cycle", key="search_query")
+        col1, col2 = st.columns(2)
+        with col1:
+            grade = st.selectbox("Grade", ["Any", "K", "1", "2", "3", "4", "5"], key="search_grade")
+        with col2:
+            passage_type = st.selectbox("Type", ["Any", "story", "informational"], key="search_type")
+
+        if not query.strip():
+            return
+
+        results = search_index.default_index().search(
+            query,
+            grade=None if grade == "Any" else grade,
+            passage_type=None if passage_type == "Any" else passage_type,
+            limit=8
+        )
+        if not results:
+            st.caption("No stories found. Try other words!")
+            return
+
+        for result in results:
+            label = f"{result['title']} (Grade {result['grade']})"
+            if st.button(label, key=f"search_{result['id']}", use_container_width=True):
+                st.session_state.selected_grade = result['grade']
+                st.session_state.current_passage = PassageDatabase.get_passage_by_id(result['id'])
+                st.session_state.current_questions = QuestionBank.get_questions_for_passage(result['id'])
+                st.session_state.answers = {}
+                st.session_state.show_results = False
+                st.rerun()
+        st.caption("Pick a story, then open 📚 Read a Story.")
+
 def show_home():
     """Show home page"""
 
@@ -221,7 +291,8 @@ def show_home():
     st.markdown("---")
 
     # Quick stats
-    stats = st.session_state.tracker.get_overall_stats()
+    with current_tracker() as tracker:
+        stats = tracker.get_overall_stats()
 
     if stats['total_passages_read'] > 0:
         st.subheader("Your Quick Stats")
@@ -432,6 +503,8 @@ def show_passage_and_questions():
         if len(st.session_state.answers) == len(questions):
             if st.button("Submit Answers", use_container_width=True, type="primary"):
                 st.session_state.show_results = True
+                st.session_state.attempt_token = uuid.uuid4().hex
+                st.session_state.results = None
                 st.rerun()
         else:
             st.warning(f"Please answer all {len(questions)} questions before submitting.")
@@ -449,15 +522,24 @@ def show_session_results():
 
     st.markdown("### 🎉 Awesome! Let's See How You Did!")
 
-    # Evaluate all answers
-    results = []
-    for idx, question in enumerate(questions):
-        user_answer = st.session_state.answers[idx]
-        result = evaluator.evaluate_answer(question, user_answer)
-        results.append(result)
+    # Evaluate all answers once per attempt; reruns reuse the results
+    if st.session_state.results is None:
+        results = []
+        for idx, question in enumerate(questions):
+            user_answer = st.session_state.answers[idx]
+            result = evaluator.evaluate_answer(question, user_answer)
+            results.append(result)
+
+        st.session_state.results = {
+            'results': results,
+            'summary': evaluator.generate_performance_summary(results),
+            'committed': False
+        }
+
+    results = st.session_state.results['results']
 
     # Show summary
-    summary = evaluator.generate_performance_summary(results)
+    summary = st.session_state.results['summary']
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -504,13 +586,17 @@ def show_session_results():
         st.markdown('</div>', unsafe_allow_html=True)
         st.markdown("")
 
-    # Save progress
-    st.session_state.tracker.record_session(
-        passage.grade,
-        passage.id,
-        passage.title,
-        results
-    )
+    # Save progress exactly once for this attempt
+    if not st.session_state.results['committed']:
+        with current_tracker() as tracker:
+            tracker.commit_session(
+                st.session_state.attempt_token,
+                passage.grade,
+                passage.id,
+                passage.title,
+                results
+            )
+        st.session_state.results['committed'] = True
 
     st.markdown("---")
 
@@ -529,7 +615,8 @@ def show_progress():
     """Show progress report"""
     st.subheader("📊 Your Progress Report")
 
-    stats = st.session_state.tracker.get_overall_stats()
+    with current_tracker() as tracker:
+        stats = tracker.get_overall_stats()
 
     if stats['total_passages_read'] == 0:
         st.info("You haven't completed any reading sessions yet. Start practicing to see your progress!")
@@ -556,9 +643,19 @@ def show_progress():
             if count > 0:
                 st.markdown(f"**Grade {grade}:** {count} passage(s)")
 
+    # Progress by question type
+    with current_tracker() as tracker:
+        type_performance = tracker.get_question_type_performance()
+
+    if type_performance:
+        st.markdown("### Progress by Question Type")
+        for q_type, q_stats in type_performance.items():
+            st.markdown(f"**{q_type}:** {q_stats['correct']}/{q_stats['total']} ({q_stats['accuracy']:.1f}%)")
+
     # Recent sessions
     st.markdown("### Recent Sessions")
-    recent = st.session_state.tracker.get_recent_sessions()
+    with current_tracker() as tracker:
+        recent = tracker.get_recent_sessions()
 
     if recent:
         for session in recent:
@@ -566,11 +663,122 @@ def show_progress():
                 st.metric("Accuracy", f"{session['accuracy']:.1f}%")
                 st.markdown(f"Correct: {session['correct_answers']}/{session['total_questions']}")
 
+                # Per-question answers are only loaded when asked for
+                if session.get('id') and st.checkbox("Show my answers", key=f"detail_{session['id']}"):
+                    show_session_detail(session)
+
     # Improvement trend
-    trend = st.session_state.tracker.get_improvement_trend()
+    with current_tracker() as tracker:
+        trend = tracker.get_improvement_trend()
     st.markdown("### Trend")
     st.info(trend)
 
+    with current_tracker() as tracker:
+        trend_report = tracker.get_trend_report()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        last_7 = trend_report['last_7_days']
+        st.metric("Last 7 Days", f"{last_7:.1f}%" if last_7 is not None else "-")
+    with col2:
+        last_30 = trend_report['last_30_days']
+        st.metric("Last 30 Days", f"{last_30:.1f}%" if last_30 is not None else "-")
+    with col3:
+        slope = trend_report['weekly_slope']
+        st.metric("Weekly Change", f"{slope:+.1f}%" if slope is not None else "-")
+
+    type_trends = {q_type: q_trend for q_type, q_trend in trend_report['question_types'].items()
+                   if q_trend['slope'] is not None}
+    if type_trends:
+        st.markdown("**Weekly change by question type:**")
+        for q_type, q_trend in type_trends.items():
+            st.markdown(f"**{q_type}:** {q_trend['slope']:+.1f}% per week "
+                        f"({q_trend['accuracy']:.1f}% overall)")
+
+def show_session_detail(session):
+    """Show the per-question answers of a recorded session"""
+    with current_tracker() as tracker:
+        results = tracker.get_session_results(session)
+
+    if not results:
+        st.caption("Answer details are not available for this session.")
+        return
+
+    for idx, result in enumerate(results):
+        mark = "✓" if result['correct'] else "✗"
+        st.markdown(f"{mark} **Q{idx + 1}.** {result.get('question_text', result['question_type'])}")
+        st.caption(f"Your answer: {result.get('answer') or '-'} | Correct answer: {result.get('correct_answer', '-')}")
+
+def show_teacher_dashboard():
+    """Show class and school rollups for teachers"""
+    st.subheader("🍎 Teacher Dashboard")
+    rollups = get_progress_store().rollups
+
+    with st.expander("Manage classes"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            new_student = st.text_input("Student ID").strip()
+        with col2:
+            new_class = st.text_input("Class").strip()
+        with col3:
+            new_school = st.text_input("School", value="default").strip()
+        if st.button("Add student to class") and new_student and new_class:
+            try:
+                ProgressStore.validate_student_id(new_student)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                rollups.assign_student(new_student, new_class, new_school or "default")
+                st.success(f"Added {new_student} to {new_class}")
+        if st.button("Recount from saved progress"):
+            rollups.rebuild(get_progress_store())
+            st.success("Class numbers recounted")
+
+    if st.button("🔄 Refresh"):
+        rollups.refresh()
+
+    schools = rollups.school_ids()
+    if not schools:
+        st.info("No classes yet. Add students to a class to see class-level numbers.")
+        return
+
+    school_id = st.selectbox("School", schools)
+    school = rollups.school_view(school_id)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("School Sessions", school['sessions'])
+    with col2:
+        st.metric("School Average Accuracy", f"{school['average_accuracy']:.1f}%")
+
+    class_id = st.selectbox("Class", rollups.class_ids(school_id))
+    view = rollups.class_view(class_id)
+    if view is None:
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Students", view['students'])
+    with col2:
+        st.metric("Sessions", view['sessions'])
+    with col3:
+        st.metric("Average Accuracy", f"{view['average_accuracy']:.1f}%")
+
+    if view['by_grade']:
+        st.markdown("### Average Accuracy by Grade")
+        for grade, accuracy in view['by_grade'].items():
+            st.markdown(f"**Grade {grade}:** {accuracy:.1f}%")
+
+    if view['weakest_types']:
+        st.markdown("### Weakest Question Types")
+        for q_type, accuracy in view['weakest_types']:
+            st.markdown(f"**{q_type}:** {accuracy:.1f}%")
+
+    st.markdown("### Students Who May Need Help")
+    if view['struggling']:
+        for student, accuracy in view['struggling']:
+            st.markdown(f"**{student}:** {accuracy:.1f}% over their last sessions")
+    else:
+        st.caption("Nobody in this class is struggling right now.")
+
 def show_help():
     """Show help page"""
     st.subheader("❓ Help & Instructions")
@@ -613,6 +821,8 @@ def reset_session():
     st.session_state.current_questions = []
     st.session_state.answers = {}
     st.session_state.show_results = False
+    st.session_state.attempt_token = None
+    st.session_state.results = None
     st.session_state.selected_grade = None
 
 if __name__ == '__main__':
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Benchmarks and stress checks for progress storage
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from analytics import SessionColumns
+from importer import BulkImporter, read_jsonl
+from progress_storage import JSONLogStorage, WriteBehindStorage, create_storage
+from progress_store import ProgressStore
+from progress_tracker import ProgressTracker
+from serializers import available_serializers
+
+SAMPLE_RESULTS = [
+    {'correct': True, 'question_type': 'Main Idea', 'question_id': 'g3_1_q1', 'answer': 'B'},
+    {'correct': False, 'question_type': 'Inference', 'question_id': 'g3_1_q2', 'answer': 'A'},
+    {'correct': True, 'question_type': 'Character Analysis', 'question_id': 'g3_1_q3', 'answer': 'B'},
+]
+
+
+def _concurrent_writer(data_file, driver, worker, sessions, compact_threshold):
+    """Record sessions from one process, each with a unique title"""
+    options = {'compact_threshold': compact_threshold} if driver == 'json' else {}
+    tracker = ProgressTracker(data_file, driver=driver, student='stress', **options)
+
+    for i in range(sessions):
+        tracker.record_session('3', 'g3_1', f'worker-{worker}-session-{i}', SAMPLE_RESULTS)
+    tracker.close()
+
+
+def run_concurrency(args):
+    """Hammer one progress file from several processes and check nothing is lost"""
+    print(f"Concurrency check: {args.processes} processes x {args.sessions} sessions "
+          f"({args.driver} driver)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, 'progress.db' if args.driver == 'sqlite' else 'progress.json')
+
+        workers = [
+            multiprocessing.Process(
+                target=_concurrent_writer,
+                args=(data_file, args.driver, worker, args.sessions, args.compact_threshold)
+            )
+            for worker in range(args.processes)
+        ]
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        tracker = ProgressTracker(data_file, driver=args.driver, student='stress')
+        titles = [s['passage_title'] for s in tracker.storage.iter_sessions()]
+        stats = tracker.get_overall_stats()
+        item = tracker.get_item_statistics(SAMPLE_RESULTS[0]['question_id'])
+        tracker.close()
+
+    expected = args.processes * args.sessions
+    unique = len(set(titles))
+    print(f"  Recorded:   {expected} sessions in {elapsed:.2f}s "
+          f"({expected / elapsed:.0f} sessions/s)")
+    print(f"  In history: {len(titles)} ({unique} unique)")
+    print(f"  In stats:   {stats['total_passages_read']}")
+    print(f"  Item stats: {item['attempts'] if item else 0} attempts")
+
+    if len(titles) == unique == stats['total_passages_read'] == expected and \
+            item and item['attempts'] == expected:
+        print("  OK: no sessions lost or duplicated")
+        return 0
+    print("  FAILED: sessions were lost or duplicated")
+    return 1
+
+
+class _FailingStorage:
+    """Wraps a driver so its first appends fail as a locked database would"""
+
+    def __init__(self, storage, failures):
+        self.storage = storage
+        self.data_file = storage.data_file
+        self.student = storage.student
+        self.failures = failures
+
+    def append_sessions(self, sessions):
+        if self.failures > 0:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        self.storage.append_sessions(sessions)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+def run_write_behind(args):
+    """Make the write-behind driver fail with a non-OS error and check nothing is lost"""
+    print(f"Write-behind check: {args.sessions} sessions, first {args.failures} writes fail")
+    status = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inner = _FailingStorage(create_storage('json', os.path.join(tmp_dir, 'progress.json')),
+                                args.failures)
+        storage = WriteBehindStorage(inner, flush_interval=0.05, max_batch=10)
+        for i in range(args.sessions):
+            storage.append_sessions([_sample_session(i)])
+
+        # Let the flusher thread run into at least one failure itself
+        deadline = time.perf_counter() + 5
+        while inner.failures == args.failures and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+        raised = 0
+        while True:
+            try:
+                storage.flush()
+                break
+            except sqlite3.OperationalError:
+                raised += 1
+        alive = storage._thread.is_alive()
+        storage.append_sessions([_sample_session(args.sessions)])
+        storage.close()
+
+        reopened = create_storage('json', os.path.join(tmp_dir, 'progress.json'))
+        stored = reopened.count_sessions()
+        reopened.close()
+
+    print(f"  Errors raised to the caller: {raised}")
+    print(f"  Flusher alive after errors:  {alive}")
+    print(f"  Stored: {stored} of {args.sessions + 1}")
+    if not alive or stored != args.sessions + 1 or storage.last_error is not None:
+        print("  FAILED: the write-behind queue lost sessions or its flusher")
+        status = 1
+    else:
+        print("  OK: failed batches were retried and reported")
+    return status
+
+
+def _import_lines(sessions, students):
+    """Write import records, half with IDs (shared between students), plus one repeated line"""
+    lines = []
+    for i in range(sessions):
+        record = {
+            'student': f'student-{i % students}',
+            'date': f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T{i // 60 % 24:02d}:{i % 60:02d}:00',
+            'passage_id': 'g3_1',
+            'results': [{'question_id': 'g3_1_q1', 'answer': 'ABCD'[i % 4]}]
+        }
+        if i % 2:
+            record['id'] = f'imported-{i // students}'
+        lines.append(json.dumps(record) + '\n')
+    return lines + lines[-1:]
+
+
+def run_import_twice(args):
+    """Import the same file twice on each driver and check nothing is stored twice"""
+    print(f"Import check: {args.sessions} sessions, {args.students} students, imported twice")
+    lines = _import_lines(args.sessions, args.students)
+    status = 0
+    for driver in ('json', 'sqlite'):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            summaries = []
+            for _ in range(2):
+                store = ProgressStore(tmp_dir, driver=driver)
+                try:
+                    summaries.append(BulkImporter(store=store).add_all(read_jsonl(lines)).finish())
+                finally:
+                    store.close()
+
+            store = ProgressStore(tmp_dir, driver=driver)
+            stored = sum(store.get_tracker(student_id).storage.count_sessions()
+                         for student_id in store.iter_student_ids())
+            store.close()
+
+        first, second = summaries
+        print(f"  {driver}: first run {first['imported']} imported, {first['skipped']} skipped; "
+              f"second run {second['imported']} imported, {second['skipped']} skipped; "
+              f"{stored} stored")
+        if (first['imported'], first['skipped']) != (args.sessions, 1) or \
+                (second['imported'], second['skipped']) != (0, args.sessions + 1) or \
+                stored != args.sessions or first['errors'] or second['errors']:
+            print(f"  FAILED: {driver} stored duplicates or rejected records")
+            status = 1
+    if not status:
+        print("  OK: the second import changed nothing")
+    return status
+
+
+def run_legacy_migration(args):
+    """Upgrade a legacy progress file and check no unrecoverable text is dropped"""
+    print("Legacy migration check: answers with and without a known question_id")
+    known = {'question_id': 'g3_1_q1', 'answer': 'A', 'correct': True,
+             'question_type': 'Main Idea', 'feedback': 'Correct!', 'explanation': 'From the bank'}
+    unknown = {'answer': 'B', 'correct': False, 'question_type': 'Inference',
+               'feedback': 'Not quite.', 'explanation': 'Only kept in this record'}
+    legacy = {'sessions': [{
+        'date': '2024-01-01T12:00:00', 'grade': '3', 'passage_id': 'g3_1',
+        'passage_title': 'The Mystery of the Missing Books', 'total_questions': 2,
+        'correct_answers': 1, 'accuracy': 50.0, 'results': [known, unknown]
+    }]}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, 'progress.json')
+        with open(data_file, 'w') as f:
+            json.dump(legacy, f)
+        storage = create_storage('json', data_file)
+        results = [storage.session_results(session) for session in storage.iter_sessions()]
+        storage.close()
+
+    print(f"  Upgraded results: {results}")
+    expected = [[{'question_id': 'g3_1_q1', 'answer': 'A', 'correct': True,
+                  'question_type': 'Main Idea'}, unknown]]
+    if results != expected:
+        print("  FAILED: the upgrade dropped text the QuestionBank cannot supply")
+        return 1
+    print("  OK: only answers to known questions were slimmed")
+    return 0
+
+
+def _sample_session(i):
+    """Build a session record like the ones ProgressTracker writes, dated now"""
+    return {
+        'id': f'{i:032x}',
+        'date': datetime.now().isoformat(),
+        'grade': '3',
+        'passage_id': 'g3_1',
+        'passage_title': f'session-{i}',
+        'total_questions': 3,
+        'correct_answers': 2,
+        'accuracy': 66.67,
+        'by_type': {'Main Idea': [1, 1], 'Inference': [0, 1], 'Character Analysis': [1, 1]},
+        'results': SAMPLE_RESULTS
+    }
+
+
+def _time_legacy(tmp_dir, sessions):
+    """Time the old format: the whole history as one indented JSON document"""
+    data_file = os.path.join(tmp_dir, 'legacy.json')
+    start = time.perf_counter()
+    with open(data_file, 'w') as f:
+        json.dump({'sessions': sessions}, f, indent=2)
+    saved = time.perf_counter()
+    with open(data_file, 'r') as f:
+        loaded = len(json.load(f)['sessions'])
+    done = time.perf_counter()
+    return saved - start, done - saved, os.path.getsize(data_file), loaded
+
+
+def _time_serializer(tmp_dir, name, sessions, batch_size):
+    """Time saving sessions through the session log and reading them back"""
+    data_file = os.path.join(tmp_dir, name, 'progress.json')
+    start = time.perf_counter()
+    storage = JSONLogStorage(data_file, serializer=name)
+    for i in range(0, len(sessions), batch_size):
+        storage.append_sessions(sessions[i:i + batch_size])
+    storage.close()
+    saved = time.perf_counter()
+
+    storage = JSONLogStorage(data_file, serializer=name)
+    loaded = sum(1 for _ in storage.iter_sessions())
+    storage.close()
+    done = time.perf_counter()
+
+    directory = os.path.dirname(data_file)
+    size = sum(os.path.getsize(os.path.join(directory, entry)) for entry in os.listdir(directory))
+    return saved - start, done - saved, size, loaded
+
+
+def run_serializers(args):
+    """Compare save and load times of the available serializers"""
+    names = available_serializers()
+    print(f"Serializer benchmark: {', '.join(names)} (batches of {args.batch_size})")
+    print(f"  {'sessions':>8}  {'format':<14} {'save':>8} {'load':>8} {'size':>10}")
+
+    status = 0
+    for size in args.sizes:
+        sessions = [_sample_session(i) for i in range(size)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rows = [('legacy indent=2', _time_legacy(tmp_dir, sessions))]
+            rows += [(name, _time_serializer(tmp_dir, name, sessions, args.batch_size))
+                     for name in names]
+
+        for label, (save, load, file_size, loaded) in rows:
+            print(f"  {size:>8}  {label:<14} {save:>7.2f}s {load:>7.2f}s "
+                  f"{file_size / 1024:>8.0f}KB")
+            if loaded != size:
+                print(f"  FAILED: {label} read back {loaded} of {size} sessions")
+                status = 1
+    return status
+
+
+def run_analytics(args):
+    """Time columnar analytics over a large synthetic answer history"""
+    sessions = args.answers // len(SAMPLE_RESULTS)
+    print(f"Analytics benchmark: {sessions} sessions, "
+          f"{sessions * len(SAMPLE_RESULTS)} answer records")
+
+    history = []
+    for i in range(sessions + args.extend):
+        session = _sample_session(i)
+        session.pop('results')
+        session['grade'] = 'K12345'[i % 6]
+        session['passage_id'] = f'g{i % 6}_{i % 40}'
+        session['date'] = f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T12:00:00'
+        history.append((f'student-{i % 500}', session))
+
+    start = time.perf_counter()
+    columns = SessionColumns.from_sessions(history[:sessions])
+    built = time.perf_counter()
+    columns.per_grade()
+    columns.per_passage()
+    columns.per_type()
+    columns.per_student()
+    columns.rolling_accuracy(7)
+    done = time.perf_counter()
+    # What ProgressTracker.get_analytics does once the columns are cached
+    columns = columns.extend(history[sessions:])
+    extended = time.perf_counter()
+
+    print(f"  Build columns: {built - start:.2f}s")
+    print(f"  Statistics:    {done - built:.3f}s (grade, passage, type, student, rolling)")
+    print(f"  Extend by {args.extend} sessions: {extended - done:.3f}s")
+    if len(columns) != sessions + args.extend:
+        print("  FAILED: extending the columns lost sessions")
+        return 1
+    return 0
+
+
+def main():
+    """Run the selected benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    concurrency = subparsers.add_parser('concurrency', help=run_concurrency.__doc__)
+    concurrency.add_argument('--driver', choices=['json', 'sqlite'], default='json')
+    concurrency.add_argument('--processes', type=int, default=8)
+    concurrency.add_argument('--sessions', type=int, default=200)
+    concurrency.add_argument('--compact-threshold', type=int, default=100)
+    concurrency.set_defaults(func=run_concurrency)
+
+    serializers = subparsers.add_parser('serializers', help=run_serializers.__doc__)
+    serializers.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    serializers.add_argument('--batch-size', type=int, default=50)
+    serializers.set_defaults(func=run_serializers)
+
+    write_behind = subparsers.add_parser('write-behind', help=run_write_behind.__doc__)
+    write_behind.add_argument('--sessions', type=int, default=100)
+    write_behind.add_argument('--failures', type=int, default=5)
+    write_behind.set_defaults(func=run_write_behind)
+
+    import_twice = subparsers.add_parser('import-twice', help=run_import_twice.__doc__)
+    import_twice.add_argument('--sessions', type=int, default=1000)
+    # More students than shards, so some share a SQLite file
+    import_twice.add_argument('--students', type=int, default=300)
+    import_twice.set_defaults(func=run_import_twice)
+
+    legacy_migration = subparsers.add_parser('legacy-migration', help=run_legacy_migration.__doc__)
+    legacy_migration.set_defaults(func=run_legacy_migration)
+
+    analytics = subparsers.add_parser('analytics', help=run_analytics.__doc__)
+    analytics.add_argument('--answers', type=int, default=3000000)
+    analytics.add_argument('--extend', type=int, default=1000)
+    analytics.set_defaults(func=run_analytics)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
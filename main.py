@@ -4,6 +4,7 @@ Reading Comprehension Tool for Elementary Students
 Main entry point
 """
 
+import argparse
 import sys
 import os
 
@@ -23,13 +24,28 @@ from reading_passages import PassageDatabase, ReadingPassage
 from questions import QuestionBank
 from evaluator import Evaluator
 from progress_tracker import ProgressTracker
+from progress_store import ProgressStore
+from progress_storage import create_storage
+from progress_schema import SCHEMA_VERSION
+import exporter
+import importer
+import sync
+import corpus_bundle
+import readability
+import search_index
+from passage_corpus import PassageCorpus
 
 
 class ReadingComprehensionTool:
     """Main application class"""
 
-    def __init__(self):
-        self.tracker = ProgressTracker()
+    def __init__(self, student_id=None):
+        if student_id:
+            self.store = ProgressStore(write_behind=True)
+            self.tracker = self.store.get_tracker(student_id)
+        else:
+            self.store = None
+            self.tracker = ProgressTracker(write_behind=True)
         self.evaluator = Evaluator()
 
     def print_colored(self, text, color=None, style=None):
@@ -258,6 +274,13 @@ class ReadingComprehensionTool:
             if count > 0:
                 print(f"Grade {grade}: {count} passage(s)")
 
+        type_performance = self.tracker.get_question_type_performance()
+        if type_performance:
+            print("\nPerformance by Question Type:")
+            self.print_divider()
+            for q_type, q_stats in type_performance.items():
+                print(f"{q_type}: {q_stats['correct']}/{q_stats['total']} ({q_stats['accuracy']:.1f}%)")
+
         # Recent sessions
         recent = self.tracker.get_recent_sessions()
         if recent:
@@ -267,6 +290,19 @@ class ReadingComprehensionTool:
                 print(f"- {session['passage_title']} (Grade {session['grade']})")
                 print(f"  Accuracy: {session['accuracy']:.1f}% ({session['correct_answers']}/{session['total_questions']})")
 
+        # Rolling accuracy and weekly trends
+        trend_report = self.tracker.get_trend_report()
+        print("\nTrends:")
+        self.print_divider()
+        for label, key in (("Last 7 days", 'last_7_days'), ("Last 30 days", 'last_30_days')):
+            if trend_report[key] is not None:
+                print(f"{label}: {trend_report[key]:.1f}% accuracy")
+        if trend_report['weekly_slope'] is not None:
+            print(f"Weekly change: {trend_report['weekly_slope']:+.1f}% per week")
+        for q_type, q_trend in trend_report['question_types'].items():
+            if q_trend['slope'] is not None:
+                print(f"{q_type}: {q_trend['slope']:+.1f}% per week")
+
         # Improvement trend
         trend = self.tracker.get_improvement_trend()
         print(f"\nTrend: {trend}")
@@ -332,10 +368,265 @@ class ReadingComprehensionTool:
             input("\nPress Enter to continue...")
 
 
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Reading Comprehension Tool")
+    parser.add_argument(
+        '--student',
+        help="Student ID; keeps this student's progress separate under data/students"
+    )
+    subparsers = parser.add_subparsers(dest='command')
+
+    export = subparsers.add_parser(
+        'export', help="Stream sessions or per-question results to CSV or JSONL"
+    )
+    export.add_argument('--kind', choices=['sessions', 'results'], default='sessions')
+    export.add_argument('--format', choices=exporter.EXPORT_FORMATS, default='csv')
+    export.add_argument('--output', help="File to write (default: standard output)")
+    export.add_argument('--from', dest='start', metavar='YYYY-MM-DD',
+                        help="First day to include")
+    export.add_argument('--to', dest='end', metavar='YYYY-MM-DD',
+                        help="Last day to include")
+    export.add_argument('--grade', dest='grades', action='append',
+                        help="Grade level to include (repeatable)")
+    export.add_argument('--student', dest='students', action='append',
+                        help="Student ID to include (repeatable)")
+    export.add_argument('--store', default='data/students',
+                        help="Student store to export (default: data/students)")
+    export.add_argument('--driver', choices=['json', 'sqlite'], default='json',
+                        help="Storage driver of the store or data file")
+    export.add_argument('--data-file',
+                        help="Export one progress file instead of a student store")
+
+    bulk_import = subparsers.add_parser(
+        'import', help="Replay historical sessions from JSONL or CSV in batches"
+    )
+    bulk_import.add_argument('input', help="JSONL sessions or a CSV per-question export")
+    bulk_import.add_argument('--format', choices=importer.IMPORT_FORMATS,
+                             help="Input format (default: from the file extension)")
+    bulk_import.add_argument('--store', default='data/students',
+                             help="Student store to import into (default: data/students)")
+    bulk_import.add_argument('--driver', choices=['json', 'sqlite'], default='json',
+                             help="Storage driver of the store or data file")
+    bulk_import.add_argument('--data-file',
+                             help="Import into one progress file instead of a student store")
+    bulk_import.add_argument('--batch-size', type=int, default=500,
+                             help="Sessions written per batch and student")
+    bulk_import.add_argument('--dry-run', action='store_true',
+                             help="Only validate the input")
+
+    migrate = subparsers.add_parser(
+        'migrate', help="Upgrade stored progress to the current schema while it stays in use"
+    )
+    migrate.add_argument('--store', default='data/students',
+                         help="Student store to migrate (default: data/students)")
+    migrate.add_argument('--driver', choices=['json', 'sqlite'], default='json',
+                         help="Storage driver of the store or data file")
+    migrate.add_argument('--data-file', help="Migrate one progress file instead of a student store")
+
+    peer_sync = subparsers.add_parser(
+        'sync', help="Exchange new sessions with another store, e.g. on a shared drive"
+    )
+    peer_sync.add_argument('peer',
+                           help="Student store (or, with --data-file, progress file) to sync with")
+    peer_sync.add_argument('--store', default='data/students',
+                           help="Student store on this device (default: data/students)")
+    peer_sync.add_argument('--driver', choices=['json', 'sqlite'], default='json',
+                           help="Storage driver on this device")
+    peer_sync.add_argument('--peer-driver', choices=['json', 'sqlite'],
+                           help="Storage driver of the peer (default: same as --driver)")
+    peer_sync.add_argument('--student', dest='students', action='append',
+                           help="Student ID to sync (repeatable; default: every student)")
+    peer_sync.add_argument('--data-file', help="Sync one progress file instead of a student store")
+    peer_sync.add_argument('--batch-size', type=int, default=500,
+                           help="Sessions written per batch and student")
+
+    build_corpus = subparsers.add_parser(
+        'build-corpus', help="Compile passages and questions into a binary bundle for fast startup"
+    )
+    build_corpus.add_argument('--corpus', default=corpus_bundle.DEFAULT_CORPUS_DIR,
+                              help="Passage directory to compile (default: passages)")
+    build_corpus.add_argument('--output',
+                              help="Bundle file to write (default: .corpus.bundle in the passage directory)")
+
+    check_readability = subparsers.add_parser(
+        'check-readability', help="Score passages and flag those outside their grade's range"
+    )
+    check_readability.add_argument('--corpus', default=corpus_bundle.DEFAULT_CORPUS_DIR,
+                                   help="Passage directory to check (default: passages)")
+    check_readability.add_argument('--all', action='store_true',
+                                   help="List every passage, not only flagged ones")
+
+    search = subparsers.add_parser(
+        'search', help="Search passage titles, text and questions, best match first"
+    )
+    search.add_argument('query', nargs='+', help="Words to search for, e.g. water cycle")
+    search.add_argument('--grade', help="Only passages of this grade (K, 1-5)")
+    search.add_argument('--type', dest='passage_type', help="Only passages of this type, e.g. story")
+    search.add_argument('--limit', type=int, default=10, help="Maximum number of results")
+
+    return parser.parse_args(argv)
+
+
+def run_export(args):
+    """Run the export subcommand"""
+    if args.data_file:
+        storage = create_storage(args.driver, args.data_file, read_only=True)
+        sources = [(storage.student, storage)]
+    else:
+        store = ProgressStore(args.store, driver=args.driver)
+        sources = exporter.iter_store_sources(store, args.students)
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        count = exporter.export(sources, out, kind=args.kind, fmt=args.format,
+                                start=args.start, end=args.end, grades=args.grades)
+    finally:
+        if args.output:
+            out.close()
+        if args.data_file:
+            storage.close()
+
+    print(f"Exported {count} {args.kind} row(s)", file=sys.stderr)
+
+
+def run_import(args):
+    """Run the import subcommand"""
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    if args.data_file:
+        target = {'tracker': ProgressTracker(args.data_file, driver=args.driver)}
+    else:
+        target = {'store': ProgressStore(args.store, driver=args.driver)}
+
+    bulk = importer.BulkImporter(batch_size=args.batch_size, dry_run=args.dry_run, **target)
+    try:
+        with open(args.input, 'r', newline='') as f:
+            records = importer.read_csv(f) if fmt == 'csv' else importer.read_jsonl(f)
+            summary = bulk.add_all(records).finish()
+    finally:
+        for opened in target.values():
+            opened.close()
+
+    action = "Validated" if args.dry_run else "Imported"
+    print(f"{action} {summary['imported']} session(s), {summary['skipped']} already stored, "
+          f"{len(summary['errors'])} rejected")
+    for line_no, message in summary['errors'][:20]:
+        print(f"  line {line_no}: {message}")
+    if len(summary['errors']) > 20:
+        print(f"  ... and {len(summary['errors']) - 20} more")
+    return 1 if summary['errors'] else 0
+
+
+def run_migrate(args):
+    """Run the migrate subcommand"""
+    if args.data_file:
+        storage = create_storage(args.driver, args.data_file)
+        sources = [(storage.student, storage)]
+    else:
+        store = ProgressStore(args.store, driver=args.driver)
+        sources = exporter.iter_store_sources(store, read_only=False)
+
+    students = rewritten = 0
+    try:
+        for student_id, storage in sources:
+            rewritten += storage.migrate()
+            students += 1
+    finally:
+        if args.data_file:
+            storage.close()
+
+    print(f"Migrated {students} student(s) to schema {SCHEMA_VERSION}: "
+          f"{rewritten} file(s) rewritten")
+
+
+def run_sync(args):
+    """Run the sync subcommand"""
+    peer_driver = args.peer_driver or args.driver
+    if args.data_file:
+        local = ProgressTracker(args.data_file, driver=args.driver)
+        remote = ProgressTracker(args.peer, driver=peer_driver)
+    else:
+        local = ProgressStore(args.store, driver=args.driver)
+        remote = ProgressStore(args.peer, driver=peer_driver)
+
+    try:
+        if args.data_file:
+            summary = sync.sync_trackers(local, remote, batch_size=args.batch_size)
+        else:
+            summary = sync.sync_stores(local, remote, args.students, batch_size=args.batch_size)
+    finally:
+        local.close()
+        remote.close()
+
+    print(f"Sent {summary['sent']} session(s), received {summary['received']} session(s)")
+
+
+def run_build_corpus(args):
+    """Run the build-corpus subcommand"""
+    summary = corpus_bundle.build(args.corpus, args.output)
+    print(f"Compiled {summary['passages']} passage(s) and {summary['questions']} question(s) "
+          f"into {args.output or corpus_bundle.bundle_path(args.corpus)} "
+          f"({summary['bytes']} bytes, sha256 {summary['sha256'][:12]})")
+
+
+def run_check_readability(args):
+    """Run the check-readability subcommand"""
+    report = readability.score_corpus(PassageCorpus(args.corpus))
+    flagged = [entry for entry in report if entry['issues']]
+
+    for entry in (report if args.all else flagged):
+        m = entry['metrics']
+        print(f"{entry['id']} (Grade {entry['grade']}) {entry['title']}: "
+              f"{m['words']} words, {m['sentences']} sentences, "
+              f"FK grade {m['fk_grade']}, TTR {m['type_token_ratio']:.2f}, "
+              f"rare words {m['rare_word_density']:.0%}")
+        for issue in entry['issues']:
+            print(f"  - {issue}")
+
+    print(f"Checked {len(report)} passage(s): {len(flagged)} outside their grade's range")
+    return 1 if flagged else 0
+
+
+def run_search(args):
+    """Run the search subcommand"""
+    grade = args.grade.upper() if args.grade else None
+    query = ' '.join(args.query)
+    results = search_index.default_index().search(
+        query, grade=grade, passage_type=args.passage_type, limit=args.limit
+    )
+    for result in results:
+        print(f"{result['score']:7.2f}  {result['id']:<8} Grade {result['grade']}  "
+              f"{result['type']:<14} {result['title']}")
+    if not results:
+        print(f"No passages match {query!r}")
+
+
 def main():
     """Main entry point"""
+    args = parse_args()
+
+    if args.command == 'export':
+        run_export(args)
+        return
+    if args.command == 'import':
+        sys.exit(run_import(args))
+    if args.command == 'migrate':
+        run_migrate(args)
+        return
+    if args.command == 'sync':
+        run_sync(args)
+        return
+    if args.command == 'build-corpus':
+        run_build_corpus(args)
+        return
+    if args.command == 'check-readability':
+        sys.exit(run_check_readability(args))
+    if args.command == 'search':
+        run_search(args)
+        return
+
     try:
-        app = ReadingComprehensionTool()
+        app = ReadingComprehensionTool(student_id=args.student)
         app.run()
     except KeyboardInterrupt:
         print("\n\nGoodbye!")
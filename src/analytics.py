@@ -0,0 +1,267 @@
+"""
+Columnar analytics over session history
+"""
+
+import numpy as np
+
+from progress_aggregates import session_by_type
+
+
+def _code_map(labels=()):
+    """Map labels to small integer codes in order of first appearance
+
+    New labels are added with codes.setdefault(label, len(codes)), so the
+    map's keys are always the labels in code order.
+    """
+    return {label: code for code, label in enumerate(labels)}
+
+
+def _grouped(codes, labels, correct, total, sessions=None):
+    """
+    Sum correct and total answers per code with one bincount each
+
+    Returns:
+        Dict of label -> {'correct', 'total', 'accuracy'} plus 'sessions'
+        when session counts are given, for labels with any answers
+    """
+    size = len(labels)
+    correct_sums = np.bincount(codes, weights=correct, minlength=size)
+    total_sums = np.bincount(codes, weights=total, minlength=size)
+    session_counts = np.bincount(codes, minlength=size) if sessions else None
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = np.where(total_sums > 0, correct_sums / total_sums * 100, 0.0)
+
+    grouped = {}
+    for code, label in enumerate(labels):
+        if not total_sums[code] and (session_counts is None or not session_counts[code]):
+            continue
+        stats = {
+            'correct': int(correct_sums[code]),
+            'total': int(total_sums[code]),
+            'accuracy': float(accuracy[code])
+        }
+        if session_counts is not None:
+            stats['sessions'] = int(session_counts[code])
+        grouped[label] = stats
+    return grouped
+
+
+class AnswerColumns:
+    """Answer records as parallel arrays of type codes and outcomes
+
+    One row per (session, question type) with the correct and total answer
+    counts, loaded from each session's per-type summary.
+    """
+
+    def __init__(self, session_index, type_codes, correct, total, types):
+        self.session_index = session_index
+        self.type_codes = type_codes
+        self.correct = correct
+        self.total = total
+        self.types = types
+
+    @property
+    def answer_count(self):
+        """Number of individual answers the rows stand for"""
+        return int(self.total.sum())
+
+    def totals(self):
+        """Get overall (correct, total) answer counts"""
+        return int(self.correct.sum()), int(self.total.sum())
+
+    def per_type(self):
+        """Get correct/total/accuracy per question type"""
+        return _grouped(self.type_codes, self.types, self.correct, self.total)
+
+
+class SessionColumns:
+    """Session history as parallel NumPy arrays
+
+    Timestamps, grade codes, passage codes, student codes and correct and
+    total counts are each held in one array, with per-question-type counts
+    in an AnswerColumns table, so per-grade, per-passage, per-type,
+    per-student and rolling-window statistics are single vectorized passes
+    instead of loops over session dicts.
+    """
+
+    def __init__(self, timestamps, grade_codes, passage_codes, student_codes,
+                 correct, total, accuracy, grades, passages, students, answers):
+        self.timestamps = timestamps
+        self.grade_codes = grade_codes
+        self.passage_codes = passage_codes
+        self.student_codes = student_codes
+        self.correct = correct
+        self.total = total
+        self.accuracy = accuracy
+        self.grades = grades
+        self.passages = passages
+        self.students = students
+        self.answers = answers
+
+    @classmethod
+    def from_sessions(cls, sessions, student=None):
+        """
+        Build columns from session summaries
+
+        Args:
+            sessions: Iterable of session dicts, or of (student, session)
+                pairs when several students are mixed
+            student: Student the plain session dicts belong to
+
+        Returns:
+            SessionColumns instance
+        """
+        return cls._build(sessions, student)
+
+    def extend(self, sessions, student=None):
+        """
+        Get new columns with more sessions appended after these
+
+        Labels keep their codes, so only the added sessions are read.
+
+        Args:
+            sessions: As for from_sessions
+            student: Student the plain session dicts belong to
+
+        Returns:
+            SessionColumns instance
+        """
+        return self._build(sessions, student, base=self)
+
+    @classmethod
+    def _build(cls, sessions, student, base=None):
+        """Build columns from sessions, appended to base's if given"""
+        if base is None:
+            grades, passages, students, types = _code_map(), _code_map(), _code_map(), _code_map()
+            first = 0
+        else:
+            grades, passages = _code_map(base.grades), _code_map(base.passages)
+            students, types = _code_map(base.students), _code_map(base.answers.types)
+            first = len(base)
+        dates, grade_codes, passage_codes, student_codes = [], [], [], []
+        correct, total, accuracy = [], [], []
+        answer_sessions, type_codes, type_correct, type_total = [], [], [], []
+
+        for index, item in enumerate(sessions, first):
+            if isinstance(item, tuple):
+                owner, session = item
+            else:
+                owner, session = student, item
+
+            dates.append(session['date'])
+            grade_codes.append(grades.setdefault(session['grade'], len(grades)))
+            passage_codes.append(passages.setdefault(session['passage_id'], len(passages)))
+            student_codes.append(students.setdefault(owner, len(students)))
+            correct.append(session['correct_answers'])
+            total.append(session['total_questions'])
+            accuracy.append(session['accuracy'])
+
+            for type_name, (type_right, type_count) in session_by_type(session).items():
+                answer_sessions.append(index)
+                type_codes.append(types.setdefault(type_name, len(types)))
+                type_correct.append(type_right)
+                type_total.append(type_count)
+
+        columns = [
+            np.array(dates, dtype='datetime64[us]').astype('datetime64[s]'),
+            np.array(grade_codes, dtype=np.int32),
+            np.array(passage_codes, dtype=np.int32),
+            np.array(student_codes, dtype=np.int32),
+            np.array(correct, dtype=np.int32),
+            np.array(total, dtype=np.int32),
+            np.array(accuracy, dtype=np.float64)
+        ]
+        answer_columns = [
+            np.array(answer_sessions, dtype=np.int32),
+            np.array(type_codes, dtype=np.int32),
+            np.array(type_correct, dtype=np.int32),
+            np.array(type_total, dtype=np.int32)
+        ]
+        if base is not None:
+            columns = [np.concatenate(pair) for pair in zip(
+                (base.timestamps, base.grade_codes, base.passage_codes, base.student_codes,
+                 base.correct, base.total, base.accuracy), columns)]
+            answer_columns = [np.concatenate(pair) for pair in zip(
+                (base.answers.session_index, base.answers.type_codes,
+                 base.answers.correct, base.answers.total), answer_columns)]
+
+        answers = AnswerColumns(*answer_columns, list(types))
+        return cls(*columns, list(grades), list(passages), list(students), answers)
+
+    @classmethod
+    def from_storage(cls, storage):
+        """Build columns from every session a storage driver holds"""
+        return cls.from_sessions(storage.iter_sessions(), student=storage.student)
+
+    @classmethod
+    def from_store(cls, store):
+        """Build columns from every student in a ProgressStore"""
+        def sessions():
+            for student_id in store.iter_student_ids():
+                with store.open_tracker(student_id) as tracker:
+                    for session in tracker.storage.iter_sessions():
+                        yield student_id, session
+        return cls.from_sessions(sessions())
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def per_grade(self):
+        """Get sessions/correct/total/accuracy per grade"""
+        return _grouped(self.grade_codes, self.grades, self.correct, self.total, sessions=True)
+
+    def per_passage(self):
+        """Get sessions/correct/total/accuracy per passage"""
+        return _grouped(self.passage_codes, self.passages, self.correct, self.total, sessions=True)
+
+    def per_student(self):
+        """Get sessions/correct/total/accuracy per student"""
+        return _grouped(self.student_codes, self.students, self.correct, self.total, sessions=True)
+
+    def per_type(self):
+        """Get correct/total/accuracy per question type"""
+        return self.answers.per_type()
+
+    def rolling_accuracy(self, window_days=7):
+        """
+        Get answer accuracy over a trailing window for every day
+
+        Args:
+            window_days: Length of the window ending on each day
+
+        Returns:
+            (days, accuracy) arrays covering every day from the first
+            session to the last; accuracy is NaN where the window holds
+            no answers
+        """
+        if not len(self):
+            return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.float64)
+
+        days = self.timestamps.astype('datetime64[D]')
+        first = days.min()
+        offsets = (days - first).astype(np.int64)
+        span = int(offsets.max()) + 1
+
+        correct = np.concatenate(([0], np.cumsum(np.bincount(offsets, weights=self.correct, minlength=span))))
+        total = np.concatenate(([0], np.cumsum(np.bincount(offsets, weights=self.total, minlength=span))))
+        ends = np.arange(1, span + 1)
+        starts = np.maximum(ends - window_days, 0)
+        window_correct = correct[ends] - correct[starts]
+        window_total = total[ends] - total[starts]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            accuracy = np.where(window_total > 0, window_correct / window_total * 100, np.nan)
+        return first + np.arange(span), accuracy
+
+    def summary(self):
+        """Get overall totals plus the per-grade and per-type breakdowns"""
+        correct, total = int(self.correct.sum()), int(self.total.sum())
+        return {
+            'sessions': len(self),
+            'total_questions': total,
+            'correct_answers': correct,
+            'accuracy': correct / total * 100 if total else 0,
+            'by_grade': self.per_grade(),
+            'by_type': self.per_type()
+        }
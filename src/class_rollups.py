@@ -0,0 +1,292 @@
+"""
+Materialized class and school rollups for teacher dashboards
+"""
+
+import atexit
+import json
+import os
+import threading
+
+from file_lock import FileLock
+from progress_aggregates import session_by_type
+from progress_storage import atomic_write_json, file_stamp
+
+
+def new_totals():
+    """Create empty session/accuracy/answer totals"""
+    return {'sessions': 0, 'accuracy_sum': 0, 'questions': 0, 'correct': 0}
+
+
+def add_totals(totals, session):
+    """Add one session to a totals dict"""
+    totals['sessions'] += 1
+    totals['accuracy_sum'] += session['accuracy']
+    totals['questions'] += session['total_questions']
+    totals['correct'] += session['correct_answers']
+
+
+def new_rollup():
+    """Create an empty class or school rollup"""
+    return dict(new_totals(), grades={}, types={})
+
+
+def add_to_rollup(rollup, session):
+    """Fold one session into a rollup's totals, grade and type breakdowns"""
+    add_totals(rollup, session)
+    add_totals(rollup['grades'].setdefault(session['grade'], new_totals()), session)
+    for type_name, (correct, total) in session_by_type(session).items():
+        counts = rollup['types'].setdefault(type_name, [0, 0])
+        counts[0] += correct
+        counts[1] += total
+
+
+class ClassRollups:
+    """Per-class and per-school rollups kept up to date as sessions are recorded
+
+    A roster (classes.json) maps each class to its school and students.
+    Every recorded session of a rostered student is folded into its class
+    and school rollups (rollups.json): totals, per-grade and per-question-
+    type counts, per-student totals with the student's most recent
+    accuracies, and the materialized list of struggling students. Dashboard
+    views read these rollups only, so they cost the same for a class of 3
+    or a school of 3000.
+
+    Like the item statistics index, sessions are buffered and merged into
+    the file under an exclusive lock every flush_every sessions and on
+    flush or close, so several processes can feed the same rollups. The
+    roster is re-read whenever its file changes, so students assigned by
+    another process are counted from their next session on.
+    """
+
+    RECENT_SESSIONS = 5
+    STRUGGLING_ACCURACY = 60
+    STRUGGLING_MIN_SESSIONS = 3
+
+    def __init__(self, root_dir='data/students', flush_every=20):
+        self.roster_file = os.path.join(root_dir, 'classes.json')
+        self.rollups_file = os.path.join(root_dir, 'rollups.json')
+        self.flush_every = flush_every
+        self.lock = FileLock(os.path.join(root_dir, 'rollups.lock'))
+
+        self._mutex = threading.RLock()
+        self._pending = []
+        self._roster_stamp = file_stamp(self.roster_file)
+        self._roster = self._read(self.roster_file, {'classes': {}})
+        self._student_classes = self._index_roster(self._roster)
+        self._rollups = self._read(self.rollups_file, {'classes': {}, 'schools': {}})
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _read(path, default):
+        """Read a JSON file, or the default if it is missing or unreadable"""
+        if not os.path.exists(path):
+            return default
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return default
+
+    def _check_roster(self):
+        """Re-read the roster if another process changed it; call with the mutex held"""
+        stamp = file_stamp(self.roster_file)
+        if stamp != self._roster_stamp:
+            self._roster_stamp = stamp
+            self._roster = self._read(self.roster_file, {'classes': {}})
+            self._student_classes = self._index_roster(self._roster)
+
+    @staticmethod
+    def _index_roster(roster):
+        """Map each student to the classes they belong to"""
+        student_classes = {}
+        for class_id, entry in roster['classes'].items():
+            for student_id in entry['students']:
+                student_classes.setdefault(student_id, []).append(class_id)
+        return student_classes
+
+    def _ensure_dir(self):
+        """Ensure the store directory exists"""
+        directory = os.path.dirname(self.roster_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def assign_student(self, student_id, class_id, school_id='default'):
+        """
+        Add a student to a class, creating the class if needed
+
+        Sessions recorded before the assignment are only counted after
+        rebuild().
+        """
+        self._ensure_dir()
+        with self._mutex, self.lock.acquire(exclusive=True):
+            roster = self._read(self.roster_file, {'classes': {}})
+            entry = roster['classes'].setdefault(class_id, {'school': school_id, 'students': []})
+            entry['school'] = school_id
+            if student_id not in entry['students']:
+                entry['students'].append(student_id)
+            atomic_write_json(self.roster_file, roster, indent=2)
+            self._roster_stamp = file_stamp(self.roster_file)
+            self._roster = roster
+            self._student_classes = self._index_roster(roster)
+
+    def classes_for(self, student_id):
+        """Get the IDs of the classes a student belongs to"""
+        return list(self._student_classes.get(student_id, ()))
+
+    def class_ids(self, school_id=None):
+        """Get the IDs of every class, or of one school's classes"""
+        return sorted(class_id for class_id, entry in self._roster['classes'].items()
+                      if school_id is None or entry['school'] == school_id)
+
+    def school_ids(self):
+        """Get the IDs of every school in the roster"""
+        return sorted({entry['school'] for entry in self._roster['classes'].values()})
+
+    def record(self, student_id, session, autoflush=True):
+        """Queue one recorded session for the student's class rollups"""
+        with self._mutex:
+            self._check_roster()
+            if student_id not in self._student_classes:
+                return
+            slim = {key: session[key] for key in
+                    ('date', 'grade', 'accuracy', 'total_questions', 'correct_answers')}
+            slim['by_type'] = session_by_type(session)
+
+            self._apply(self._rollups, student_id, slim)
+            self._pending.append((student_id, slim))
+            if autoflush and len(self._pending) >= self.flush_every:
+                self.flush()
+
+    def _apply(self, rollups, student_id, session):
+        """Fold one session into every rollup the student contributes to"""
+        for class_id in self._student_classes.get(student_id, ()):
+            school_id = self._roster['classes'][class_id]['school']
+            rollup = rollups['classes'].setdefault(class_id, dict(new_rollup(), students={}))
+            add_to_rollup(rollup, session)
+            add_to_rollup(rollups['schools'].setdefault(school_id, new_rollup()), session)
+
+            student = rollup['students'].setdefault(student_id, dict(new_totals(), recent=[]))
+            add_totals(student, session)
+            student['recent'] = (student['recent'] + [session['accuracy']])[-self.RECENT_SESSIONS:]
+            student['last_date'] = session['date']
+            self._update_struggling(rollup, student_id, student)
+
+    def _update_struggling(self, rollup, student_id, student):
+        """Keep the class's materialized struggling list in step with one student"""
+        struggling = rollup.setdefault('struggling', {})
+        recent = sum(student['recent']) / len(student['recent'])
+        if student['sessions'] >= self.STRUGGLING_MIN_SESSIONS and \
+                recent < self.STRUGGLING_ACCURACY:
+            struggling[student_id] = recent
+        else:
+            struggling.pop(student_id, None)
+
+    def flush(self):
+        """Merge queued sessions into the shared rollups file"""
+        with self._mutex:
+            if not self._pending:
+                return
+            self._ensure_dir()
+            with self.lock.acquire(exclusive=True):
+                self._check_roster()
+                rollups = self._read(self.rollups_file, {'classes': {}, 'schools': {}})
+                for student_id, session in self._pending:
+                    self._apply(rollups, student_id, session)
+                atomic_write_json(self.rollups_file, rollups, separators=(',', ':'))
+            self._rollups = rollups
+            self._pending = []
+
+    def refresh(self):
+        """Re-read the roster and rollups written by other processes"""
+        with self._mutex:
+            self.flush()
+            with self.lock.acquire(exclusive=False):
+                self._roster_stamp = file_stamp(self.roster_file)
+                self._roster = self._read(self.roster_file, {'classes': {}})
+                self._rollups = self._read(self.rollups_file, {'classes': {}, 'schools': {}})
+            self._student_classes = self._index_roster(self._roster)
+
+    def rebuild(self, store):
+        """
+        Recompute every rollup from the students' stored sessions
+
+        Used after changing the roster of students who already have history.
+
+        Args:
+            store: ProgressStore holding the rostered students
+        """
+        self._ensure_dir()
+        # Held throughout, as in flush, so no session is recorded in between
+        with self._mutex, self.lock.acquire(exclusive=True):
+            self._check_roster()
+            rollups = {'classes': {}, 'schools': {}}
+            for student_id in sorted(self._student_classes):
+                if not store.has_student(student_id):
+                    continue
+                with store.open_tracker(student_id) as tracker:
+                    for session in tracker.storage.iter_sessions():
+                        self._apply(rollups, student_id, session)
+            atomic_write_json(self.rollups_file, rollups, separators=(',', ':'))
+            self._rollups = rollups
+            self._pending = []
+
+    def close(self):
+        """Flush queued sessions"""
+        self.flush()
+        atexit.unregister(self.flush)
+
+    @staticmethod
+    def _summarize(rollup, weakest=3):
+        """Turn a rollup into dashboard numbers"""
+        def accuracy(totals):
+            return totals['accuracy_sum'] / totals['sessions'] if totals['sessions'] else 0
+
+        types = {type_name: correct / total * 100
+                 for type_name, (correct, total) in rollup['types'].items() if total}
+        return {
+            'sessions': rollup['sessions'],
+            'average_accuracy': accuracy(rollup),
+            'by_grade': {grade: accuracy(totals) for grade, totals in sorted(rollup['grades'].items())},
+            'weakest_types': sorted(types.items(), key=lambda item: item[1])[:weakest]
+        }
+
+    def class_view(self, class_id):
+        """
+        Get the teacher dashboard numbers for one class
+
+        Returns:
+            Dict with the class's sessions, average accuracy, accuracy by
+            grade, weakest question types, student count and struggling
+            students (student ID, recent accuracy), or None if unknown
+        """
+        with self._mutex:
+            entry = self._roster['classes'].get(class_id)
+            if entry is None:
+                return None
+            rollup = self._rollups['classes'].get(class_id, dict(new_rollup(), students={}))
+            view = self._summarize(rollup)
+            view.update(
+                school=entry['school'],
+                students=len(entry['students']),
+                struggling=sorted(rollup.get('struggling', {}).items(), key=lambda item: item[1])
+            )
+            return view
+
+    def school_view(self, school_id):
+        """
+        Get the dashboard numbers for a school and each of its classes
+
+        Returns:
+            Dict like class_view without the student breakdown, plus
+            'classes' mapping class ID -> (sessions, average accuracy)
+        """
+        with self._mutex:
+            view = self._summarize(self._rollups['schools'].get(school_id, new_rollup()))
+            view['classes'] = {}
+            for class_id in self.class_ids(school_id):
+                rollup = self._rollups['classes'].get(class_id)
+                sessions = rollup['sessions'] if rollup else 0
+                view['classes'][class_id] = (
+                    sessions, rollup['accuracy_sum'] / sessions if sessions else 0
+                )
+            return view
@@ -0,0 +1,286 @@
+"""
+Precompiled binary bundle of the passage and question corpus
+"""
+
+import hashlib
+import importlib.util
+import mmap
+import os
+import struct
+
+from passage_corpus import DEFAULT_CORPUS_DIR, PassageCorpus
+from progress_storage import atomic_write_bytes
+
+BUNDLE_FILE = '.corpus.bundle'
+BUNDLE_MAGIC = b'RCCORPUS'
+BUNDLE_VERSION = 1
+
+# magic, version, SHA-256 of everything after the header,
+# passage, question and option counts
+HEADER = struct.Struct('<8sI32sIII')
+# id, title, grade, type, content as (offset, length) string refs,
+# then the passage's first question and question count
+PASSAGE_ENTRY = struct.Struct('<12I')
+# id, type, question, answer, explanation string refs,
+# then the question's first option and option count
+QUESTION_ENTRY = struct.Struct('<12I')
+# option letter and option text string refs
+OPTION_ENTRY = struct.Struct('<4I')
+
+PASSAGE_FIELDS = ('id', 'title', 'grade', 'type', 'content')
+QUESTION_FIELDS = ('id', 'type', 'question', 'answer', 'explanation')
+
+
+class _StringTable:
+    """Collects strings into one UTF-8 blob, storing each distinct one once"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.refs = {}
+
+    def add(self, text):
+        """Get the (offset, length) ref of a string, adding it if needed"""
+        ref = self.refs.get(text)
+        if ref is None:
+            encoded = text.encode('utf-8')
+            ref = self.refs[text] = (len(self.data), len(encoded))
+            self.data += encoded
+        return ref
+
+
+def build_bundle(path, corpus, questions):
+    """
+    Compile passages and questions into a bundle file
+
+    Args:
+        path: Bundle file to write (replaced atomically)
+        corpus: PassageCorpus to read passages from
+        questions: Dict of passage ID -> question dicts, as
+            QuestionBank.QUESTIONS
+
+    Returns:
+        Dict with the passage, question and option counts, the bundle
+        size in bytes and its content hash
+    """
+    strings = _StringTable()
+    passage_table, question_table, option_table = bytearray(), bytearray(), bytearray()
+    question_count = option_count = 0
+
+    for record in corpus.records:
+        passage_questions = questions.get(record['id'], [])
+        refs = [strings.add(record[field]) for field in PASSAGE_FIELDS[:-1]]
+        refs.append(strings.add(corpus.read_text(record['id'])))
+        passage_table += PASSAGE_ENTRY.pack(*(n for ref in refs for n in ref),
+                                            question_count, len(passage_questions))
+
+        for q_data in passage_questions:
+            refs = [strings.add(q_data[field]) for field in QUESTION_FIELDS]
+            question_table += QUESTION_ENTRY.pack(*(n for ref in refs for n in ref),
+                                                  option_count, len(q_data['options']))
+            for letter, text in q_data['options'].items():
+                option_table += OPTION_ENTRY.pack(*strings.add(letter), *strings.add(text))
+                option_count += 1
+            question_count += 1
+
+    payload = bytes(passage_table + question_table + option_table + strings.data)
+    digest = hashlib.sha256(payload).digest()
+    header = HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, digest,
+                         len(corpus.records), question_count, option_count)
+
+    atomic_write_bytes(path, header + payload)
+
+    return {
+        'passages': len(corpus.records),
+        'questions': question_count,
+        'options': option_count,
+        'bytes': len(header) + len(payload),
+        'sha256': digest.hex()
+    }
+
+
+class CorpusBundle:
+    """A bundle file opened through mmap
+
+    Opening checks the header and the content hash, then decodes only the
+    short passage metadata strings. Passage text and questions are decoded
+    from the mapped string table when they are asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._validate()
+        except ValueError:
+            self._map.close()
+            raise
+
+        self._passages = {}
+        self._question_ids = None
+        self.records = []
+        for index in range(self.passage_count):
+            entry = PASSAGE_ENTRY.unpack_from(self._map, self._passages_at + index * PASSAGE_ENTRY.size)
+            record = {field: self._string(entry[2 * i], entry[2 * i + 1])
+                      for i, field in enumerate(PASSAGE_FIELDS[:-1])}
+            self._passages[record['id']] = entry
+            self.records.append(record)
+
+    def _validate(self):
+        """Check the header and content hash; set the table offsets"""
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{self.path}: not a corpus bundle")
+        magic, version, digest, passages, questions, options = HEADER.unpack_from(self._map, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{self.path}: not a corpus bundle")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"{self.path}: bundle version {version}, expected {BUNDLE_VERSION}")
+        if hashlib.sha256(memoryview(self._map)[HEADER.size:]).digest() != digest:
+            raise ValueError(f"{self.path}: content hash mismatch")
+
+        self.sha256 = digest.hex()
+        self.passage_count, self.question_count = passages, questions
+        self._passages_at = HEADER.size
+        self._questions_at = self._passages_at + passages * PASSAGE_ENTRY.size
+        self._options_at = self._questions_at + questions * QUESTION_ENTRY.size
+        self._strings_at = self._options_at + options * OPTION_ENTRY.size
+
+    def _string(self, offset, length):
+        """Decode one string from the string table"""
+        start = self._strings_at + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def read_text(self, passage_id):
+        """Get a passage's text; raises KeyError for an unknown ID"""
+        entry = self._passages[passage_id]
+        return self._string(entry[8], entry[9])
+
+    def _question(self, index):
+        """Decode one question as (passage-less) question data"""
+        entry = QUESTION_ENTRY.unpack_from(self._map, self._questions_at + index * QUESTION_ENTRY.size)
+        q_data = {field: self._string(entry[2 * i], entry[2 * i + 1])
+                  for i, field in enumerate(QUESTION_FIELDS)}
+        first, count = entry[10], entry[11]
+        q_data['options'] = {}
+        for option in range(first, first + count):
+            letter_at, letter_len, text_at, text_len = OPTION_ENTRY.unpack_from(
+                self._map, self._options_at + option * OPTION_ENTRY.size
+            )
+            q_data['options'][self._string(letter_at, letter_len)] = self._string(text_at, text_len)
+        return q_data
+
+    def questions_for_passage(self, passage_id):
+        """Get the question data of one passage (empty if unknown)"""
+        entry = self._passages.get(passage_id)
+        if entry is None:
+            return []
+        first, count = entry[10], entry[11]
+        return [self._question(index) for index in range(first, first + count)]
+
+    def question(self, question_id):
+        """
+        Look up one question by ID
+
+        Returns:
+            (passage ID, question data), or None if there is no such question
+        """
+        if self._question_ids is None:
+            ids = {}
+            for passage_id, entry in self._passages.items():
+                for index in range(entry[10], entry[10] + entry[11]):
+                    id_at, id_len = QUESTION_ENTRY.unpack_from(
+                        self._map, self._questions_at + index * QUESTION_ENTRY.size
+                    )[:2]
+                    ids[self._string(id_at, id_len)] = (passage_id, index)
+            self._question_ids = ids
+
+        found = self._question_ids.get(question_id)
+        if found is None:
+            return None
+        passage_id, index = found
+        return passage_id, self._question(index)
+
+    def close(self):
+        """Unmap the bundle"""
+        self._map.close()
+
+
+def _questions_source():
+    """Get QuestionBank's module file and question data"""
+    from questions import QuestionBank
+    return importlib.util.find_spec('questions').origin, QuestionBank.QUESTIONS
+
+
+def bundle_path(corpus_dir=DEFAULT_CORPUS_DIR):
+    """Get the bundle file of a corpus directory"""
+    return os.path.join(corpus_dir, BUNDLE_FILE)
+
+
+def is_stale(path, corpus_dir=DEFAULT_CORPUS_DIR):
+    """
+    Check whether a bundle is out of date with its sources
+
+    A bundle is stale if any passage file or the question bank is newer
+    than it, or if passage files were added or removed. The directory's own
+    modification time is not used, since writing the bundle and the caches
+    kept next to it changes that too.
+    """
+    try:
+        built = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return True
+
+    names = [name for name in os.listdir(corpus_dir) if name.endswith(PassageCorpus.EXTENSIONS)]
+    if len(header) < HEADER.size or HEADER.unpack(header)[3] != len(names):
+        return True
+    sources = [_questions_source()[0]] + [os.path.join(corpus_dir, name) for name in names]
+    return any(os.stat(source).st_mtime_ns > built for source in sources)
+
+
+def build(corpus_dir=DEFAULT_CORPUS_DIR, path=None):
+    """
+    Compile a corpus directory and the question bank into its bundle
+
+    Returns:
+        Dict from build_bundle
+    """
+    return build_bundle(path or bundle_path(corpus_dir), PassageCorpus(corpus_dir),
+                        _questions_source()[1])
+
+
+def open_bundle(corpus_dir=DEFAULT_CORPUS_DIR):
+    """
+    Open a corpus directory's bundle, rebuilding it if its sources changed
+
+    A bundle that fails validation (e.g. a truncated copy) is rebuilt too.
+
+    Returns:
+        CorpusBundle, or None if the directory has no bundle yet or it
+        cannot be rebuilt or read (callers then read the corpus directly)
+    """
+    path = bundle_path(corpus_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        if is_stale(path, corpus_dir):
+            build(corpus_dir, path)
+        try:
+            return CorpusBundle(path)
+        except ValueError:
+            build(corpus_dir, path)
+            return CorpusBundle(path)
+    except (OSError, ValueError):
+        return None
+
+
+_DEFAULT = {}
+
+
+def default_bundle():
+    """Get the bundle of the default corpus, opened once per process"""
+    if 'bundle' not in _DEFAULT:
+        _DEFAULT['bundle'] = open_bundle()
+    return _DEFAULT['bundle']
@@ -15,7 +15,8 @@ class Evaluator:
             user_answer: User's answer (A, B, C, or D)
 
         Returns:
-            dict with 'correct', 'feedback', and 'explanation'
+            dict with 'correct', 'feedback', 'explanation', 'question_type',
+            'question_id' and the normalized 'answer'
         """
         is_correct = question.check_answer(user_answer)
 
@@ -28,7 +29,9 @@ class Evaluator:
             'correct': is_correct,
             'feedback': feedback,
             'explanation': question.explanation,
-            'question_type': question.type
+            'question_type': question.type,
+            'question_id': question.id,
+            'answer': user_answer.upper()
         }
 
     @staticmethod
@@ -0,0 +1,168 @@
+"""
+Streaming export of progress data for reporting
+"""
+
+import csv
+import json
+
+from progress_storage import create_storage
+
+SESSION_FIELDS = ('student', 'session_id', 'date', 'grade', 'passage_id', 'passage_title',
+                  'total_questions', 'correct_answers', 'accuracy')
+
+RESULT_FIELDS = ('student', 'session_id', 'date', 'grade', 'passage_id', 'question_id',
+                 'question_type', 'answer', 'correct')
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def iter_store_sources(store, students=None, read_only=True):
+    """
+    Yield (student ID, storage) for the students of a ProgressStore
+
+    Each student's storage is opened on its own and closed before the next
+    one, bypassing the store's tracker cache, so only one student's data is
+    held at a time. Storages are opened read-only unless asked otherwise,
+    so exporting never changes the store.
+
+    Args:
+        store: ProgressStore to export
+        students: Student IDs to include (every student if None)
+        read_only: Open each storage read-only
+    """
+    for student_id in students or store.iter_student_ids():
+        if students and not store.has_student(student_id):
+            continue
+        storage = create_storage(store.driver, store.student_path(student_id),
+                                 student=student_id, read_only=read_only)
+        try:
+            yield student_id, storage
+        finally:
+            storage.close()
+
+
+def _grade_filter(grades):
+    """Normalize grade filters, so 'k' matches grade 'K'"""
+    return {str(grade).strip().upper() for grade in grades} if grades else None
+
+
+def _matches(session, start, end, grades):
+    """Check a session against the date range and (normalized) grade filters"""
+    day = session['date'][:10]
+    if start and day < start:
+        return False
+    if end and day > end:
+        return False
+    return not grades or str(session['grade']).upper() in grades
+
+
+def iter_sessions(sources, start=None, end=None, grades=None):
+    """
+    Yield one flat row per session, streaming from storage
+
+    Args:
+        sources: Iterable of (student ID, storage) pairs
+        start: First day to include, as YYYY-MM-DD
+        end: Last day to include, as YYYY-MM-DD
+        grades: Grade levels to include (all if empty)
+
+    Yields:
+        Dicts with the SESSION_FIELDS keys
+    """
+    grades = _grade_filter(grades)
+    for student_id, storage in sources:
+        for session in storage.iter_sessions():
+            if _matches(session, start, end, grades):
+                yield {
+                    'student': student_id,
+                    'session_id': session.get('id'),
+                    'date': session['date'],
+                    'grade': session['grade'],
+                    'passage_id': session['passage_id'],
+                    'passage_title': session['passage_title'],
+                    'total_questions': session['total_questions'],
+                    'correct_answers': session['correct_answers'],
+                    'accuracy': session['accuracy']
+                }
+
+
+def iter_results(sources, start=None, end=None, grades=None):
+    """
+    Yield one flat row per answered question, streaming from storage
+
+    Takes the same arguments as iter_sessions.
+
+    Yields:
+        Dicts with the RESULT_FIELDS keys
+    """
+    grades = _grade_filter(grades)
+    for student_id, storage in sources:
+        matching = storage.iter_sessions_with_results(
+            lambda session: _matches(session, start, end, grades)
+        )
+        for session, results in matching:
+            for result in results or []:
+                yield {
+                    'student': student_id,
+                    'session_id': session.get('id'),
+                    'date': session['date'],
+                    'grade': session['grade'],
+                    'passage_id': session['passage_id'],
+                    'question_id': result.get('question_id'),
+                    'question_type': result['question_type'],
+                    'answer': result.get('answer'),
+                    'correct': result['correct']
+                }
+
+
+def write_rows(rows, out, fields, fmt='csv'):
+    """
+    Write rows to an open text file as they are produced
+
+    Args:
+        rows: Iterable of row dicts
+        out: Text file to write to
+        fields: Column order for CSV
+        fmt: 'csv' or 'jsonl'
+
+    Returns:
+        Number of rows written
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(row, separators=(',', ':')) + '\n')
+            count += 1
+    return count
+
+
+def export(sources, out, kind='sessions', fmt='csv', start=None, end=None, grades=None):
+    """
+    Stream sessions or per-question results to a file
+
+    Args:
+        sources: Iterable of (student ID, storage) pairs
+        out: Text file to write to
+        kind: 'sessions' or 'results'
+        fmt: 'csv' or 'jsonl'
+        start, end, grades: Filters, as for iter_sessions
+
+    Returns:
+        Number of rows written
+    """
+    if kind == 'sessions':
+        rows, fields = iter_sessions(sources, start, end, grades), SESSION_FIELDS
+    elif kind == 'results':
+        rows, fields = iter_results(sources, start, end, grades), RESULT_FIELDS
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+    return write_rows(rows, out, fields, fmt)
@@ -0,0 +1,110 @@
+"""
+Advisory file locking shared by processes that write the same progress files
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+
+class FileLock:
+    """Advisory lock on a lock file, reentrant within a process
+
+    Uses flock() where available (shared or exclusive) and falls back to
+    msvcrt byte-range locking, which is always exclusive, on Windows.
+    Threads of one process are serialized by an in-process lock first, so
+    a single FileLock can be shared by every thread using one data file.
+    Nested acquisitions keep the mode of the outermost one; asking for an
+    exclusive lock inside a shared one raises RuntimeError instead of
+    silently writing under a shared lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._exclusive = False
+        self._fd = None
+
+    @property
+    def exclusive(self):
+        """Whether the calling code holds the lock in exclusive mode"""
+        return self._depth > 0 and self._exclusive
+
+    @contextmanager
+    def acquire(self, exclusive=True):
+        """
+        Hold the lock for the duration of a with block
+
+        Args:
+            exclusive: Take an exclusive (write) lock instead of a shared one
+
+        Raises:
+            RuntimeError: If an exclusive lock is asked for while the lock
+                is held shared
+        """
+        with self._thread_lock:
+            if self._depth == 0:
+                self._lock_file(exclusive)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                raise RuntimeError(f"{self.path} is held shared and cannot be taken exclusively")
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._unlock_file()
+
+    def _lock_file(self, exclusive):
+        """Open (creating if needed) the lock file and take the OS-level lock"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            if exclusive:
+                raise
+            # A shared lock may be taken where this process cannot write
+            try:
+                self._fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                # Read-only media: nothing can be written under this lock
+                return
+
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        elif msvcrt is not None:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting
+                    continue
+
+    def _unlock_file(self):
+        """Release the OS-level lock and close the lock file"""
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,243 @@
+"""
+Bulk import of historical reading sessions
+"""
+
+import csv
+import hashlib
+import json
+from datetime import datetime
+
+from progress_tracker import ProgressTracker
+from questions import QuestionBank
+from reading_passages import PassageDatabase
+
+IMPORT_FORMATS = ('jsonl', 'csv')
+
+
+def read_jsonl(f):
+    """
+    Read session records from a JSON lines file
+
+    Each line is one session:
+    {"student": ..., "id": ..., "date": ..., "passage_id": ...,
+     "results": [{"question_id": ..., "answer": ...}, ...]}
+
+    Yields:
+        (line number, record or None if the line is not valid JSON)
+    """
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_no, None
+
+
+def read_csv(f):
+    """
+    Read session records from a per-question CSV file
+
+    Uses the columns written by `main.py export --kind results`; rows with
+    the same student and session_id next to each other form one session.
+
+    Yields:
+        (line number of the session's first row, record)
+    """
+    record, key, first_line = None, None, None
+    for line_no, row in enumerate(csv.DictReader(f), 2):
+        row_key = (row.get('student'), row.get('session_id'))
+        if record is None or row_key != key:
+            if record is not None:
+                yield first_line, record
+            record = {
+                'student': row.get('student') or None,
+                'id': row.get('session_id') or None,
+                'date': row.get('date'),
+                'grade': row.get('grade') or None,
+                'passage_id': row.get('passage_id'),
+                'results': []
+            }
+            key, first_line = row_key, line_no
+        record['results'].append({'question_id': row.get('question_id'),
+                                  'answer': row.get('answer')})
+    if record is not None:
+        yield first_line, record
+
+
+def validate_record(record):
+    """
+    Check one session record against the PassageDatabase and QuestionBank
+
+    Correctness and question types are taken from the QuestionBank, never
+    from the input. Dates are stored the way ProgressTracker records them:
+    naive local time in ISO format, so dates with a UTC offset are
+    converted and other ISO forms (week dates, basic format) are spelled
+    out.
+
+    Returns:
+        (passage, date, results) on success
+
+    Raises:
+        ValueError: If the record cannot be imported
+    """
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+
+    passage = PassageDatabase.get_passage_by_id(record.get('passage_id'))
+    if passage is None:
+        raise ValueError(f"unknown passage: {record.get('passage_id')!r}")
+    if record.get('grade') and str(record['grade']).upper() != passage.grade:
+        raise ValueError(f"grade {record['grade']!r} does not match passage grade {passage.grade!r}")
+
+    try:
+        date = datetime.fromisoformat(record.get('date') or '')
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid date: {record.get('date')!r}")
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+
+    answers = record.get('results')
+    if not answers or not isinstance(answers, list):
+        raise ValueError("no results")
+
+    results = []
+    for answer in answers:
+        question = QuestionBank.get_question_by_id(answer.get('question_id'))
+        if question is None or question.passage_id != passage.id:
+            raise ValueError(f"unknown question for passage {passage.id}: "
+                             f"{answer.get('question_id')!r}")
+        letter = str(answer.get('answer') or '').upper()
+        if letter not in question.options:
+            raise ValueError(f"invalid answer {answer.get('answer')!r} to {question.id}")
+        results.append({
+            'question_id': question.id,
+            'answer': letter,
+            'correct': question.check_answer(letter),
+            'question_type': question.type
+        })
+    return passage, date.isoformat(), results
+
+
+def session_id_for(student_id, record):
+    """
+    Get the ID a record is stored under
+
+    Records without an ID get one derived from their content, so importing
+    the same file again finds them already stored.
+    """
+    if record.get('id'):
+        return str(record['id'])
+    key = json.dumps([student_id, record.get('date'), record.get('passage_id'),
+                      [[r.get('question_id'), r.get('answer')] for r in record['results']]])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:32]
+
+
+class BulkImporter:
+    """Replays historical sessions into trackers in batches
+
+    Records are validated, turned into sessions and buffered per student;
+    each full batch is written with one ProgressTracker.record_sessions
+    call, so the cost of an import is linear in the number of sessions.
+    Pass a ProgressStore to import many students, or a single tracker.
+
+    Sessions whose ID is already stored for the student, or was already
+    seen earlier in the input, are skipped, so importing a file again
+    changes nothing.
+    """
+
+    def __init__(self, store=None, tracker=None, batch_size=500, dry_run=False):
+        if (store is None) == (tracker is None):
+            raise ValueError("Give either a store or a tracker")
+        self.store = store
+        self.tracker = tracker
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self._batches = {}
+        self._known_ids = {}
+
+    def _tracker_for(self, student_id):
+        """Get the tracker a student's sessions go to"""
+        if self.tracker is not None:
+            return self.tracker
+        return self.store.get_tracker(student_id)
+
+    def _ids_for(self, student_id):
+        """Get the session IDs stored or queued for a student, loading them once"""
+        ids = self._known_ids.get(student_id)
+        if ids is None:
+            if self.store is not None and not self.store.has_student(student_id):
+                ids = set()
+            else:
+                ids = self._tracker_for(student_id).storage.session_ids()
+            self._known_ids[student_id] = ids
+        return ids
+
+    def add(self, record, line_no=None):
+        """
+        Validate and buffer one session record
+
+        Returns:
+            True if the record was accepted, False if it was rejected or
+            is already stored
+        """
+        try:
+            if record is None:
+                raise ValueError("invalid JSON")
+            passage, date, results = validate_record(record)
+            student_id = record.get('student') or 'default'
+            if self.store is not None:
+                self.store.validate_student_id(student_id)
+        except ValueError as e:
+            self.errors.append((line_no, str(e)))
+            return False
+
+        # Derived IDs hash the stored date, whatever form the input used
+        session_id = session_id_for(student_id, dict(record, date=date))
+        known = self._ids_for(student_id)
+        if session_id in known:
+            self.skipped += 1
+            return False
+        known.add(session_id)
+
+        session = ProgressTracker.build_session(
+            passage.grade, passage.id, passage.title, results,
+            session_id=session_id, date=date
+        )
+        batch = self._batches.setdefault(student_id, [])
+        batch.append(session)
+        if len(batch) >= self.batch_size:
+            self._write(student_id)
+        return True
+
+    def _write(self, student_id):
+        """Persist one student's buffered sessions in date order"""
+        batch = self._batches.pop(student_id, [])
+        if not batch:
+            return
+        batch.sort(key=lambda pair: pair[0]['date'])
+        if not self.dry_run:
+            self._tracker_for(student_id).record_sessions(batch)
+        self.imported += len(batch)
+
+    def add_all(self, records):
+        """Add (line number, record) pairs from read_jsonl or read_csv"""
+        for line_no, record in records:
+            self.add(record, line_no)
+        return self
+
+    def finish(self):
+        """
+        Write every partly filled batch
+
+        Returns:
+            Dict with the number of sessions imported, the number skipped
+            as already stored and the errors as (line number, message) pairs
+        """
+        for student_id in list(self._batches):
+            self._write(student_id)
+        return {'imported': self.imported, 'skipped': self.skipped, 'errors': list(self.errors)}
@@ -0,0 +1,243 @@
+"""
+Per-question item statistics across all students
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+
+from file_lock import FileLock
+from progress_storage import atomic_write_json
+
+
+def new_item():
+    """Create empty running sums for one question"""
+    return {
+        'attempts': 0,
+        'correct': 0,
+        # answer letter -> times chosen
+        'options': {},
+        # Sums over attempts whose session had other questions, using the
+        # rest score (fraction correct on the session's other questions)
+        'scored': 0,
+        'scored_correct': 0,
+        'rest_sum': 0.0,
+        'rest_sq_sum': 0.0,
+        'rest_correct_sum': 0.0
+    }
+
+
+def add_items(target, source):
+    """Add one set of item sums into another"""
+    for question_id, sums in source.items():
+        item = target.setdefault(question_id, new_item())
+        for key, value in sums.items():
+            if key == 'options':
+                for option, count in value.items():
+                    item['options'][option] = item['options'].get(option, 0) + count
+            else:
+                item[key] += value
+
+
+def item_report(sums, correct_answer=None):
+    """
+    Derive the item statistics from one question's running sums
+
+    Args:
+        sums: Running sums from new_item
+        correct_answer: Correct option letter, used to pick the top distractor
+
+    Returns:
+        Dict with attempts, p_value (proportion correct), option_counts,
+        point_biserial (None until it can be computed) and top_distractor
+    """
+    attempts = sums['attempts']
+    p_value = sums['correct'] / attempts if attempts else None
+
+    point_biserial = None
+    scored, scored_correct = sums['scored'], sums['scored_correct']
+    if scored >= 2 and 0 < scored_correct < scored:
+        mean = sums['rest_sum'] / scored
+        variance = sums['rest_sq_sum'] / scored - mean ** 2
+        if variance > 1e-12:
+            p = scored_correct / scored
+            mean_correct = sums['rest_correct_sum'] / scored_correct
+            mean_wrong = (sums['rest_sum'] - sums['rest_correct_sum']) / (scored - scored_correct)
+            point_biserial = (mean_correct - mean_wrong) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+    distractors = {option: count for option, count in sums['options'].items()
+                   if option != correct_answer}
+    top_distractor = max(distractors, key=distractors.get) if distractors else None
+
+    return {
+        'attempts': attempts,
+        'p_value': p_value,
+        'option_counts': dict(sums['options']),
+        'point_biserial': point_biserial,
+        'top_distractor': top_distractor
+    }
+
+
+class ItemStatsIndex:
+    """Running statistics for every question, keyed by question ID
+
+    Each evaluated answer updates its question's attempt count, correct
+    count, option counts and the rest-score sums behind the corrected
+    point-biserial discrimination in O(1). Updates are kept as pending
+    deltas and added to the shared file under an exclusive lock when
+    flush_every answers are waiting (and on flush or close), so any number
+    of processes and students can feed one index without losing counts.
+    """
+
+    def __init__(self, path='data/item_stats.json', flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = FileLock(os.path.splitext(path)[0] + '.lock')
+
+        self._items = self._read()
+        self._pending = {}
+        self._pending_answers = 0
+        self._mutex = threading.RLock()
+        atexit.register(self.flush)
+
+    def _read(self):
+        """Read the persisted sums, or an empty index"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f).get('items', {})
+        except json.JSONDecodeError:
+            return {}
+
+    def record_results(self, results, autoflush=True):
+        """
+        Fold one session's evaluated answers into the index
+
+        Args:
+            results: Evaluation results with question_id, answer and correct;
+                answers without a question_id are skipped
+            autoflush: Flush once flush_every answers are pending
+        """
+        total = len(results)
+        session_correct = sum(1 for r in results if r['correct'])
+
+        with self._mutex:
+            for result in results:
+                question_id = result.get('question_id')
+                if not question_id:
+                    continue
+                correct = 1 if result['correct'] else 0
+                # Fraction correct on the other questions of the session
+                rest = (session_correct - correct) / (total - 1) if total > 1 else None
+                for items in (self._items, self._pending):
+                    self._add_answer(items, question_id, result.get('answer'), correct, rest)
+                self._pending_answers += 1
+
+            if autoflush and self._pending_answers >= self.flush_every:
+                self.flush()
+
+    @staticmethod
+    def _add_answer(items, question_id, answer, correct, rest):
+        """Add one answer to a set of item sums"""
+        item = items.get(question_id)
+        if item is None:
+            item = items[question_id] = new_item()
+        item['attempts'] += 1
+        item['correct'] += correct
+        if answer:
+            item['options'][answer] = item['options'].get(answer, 0) + 1
+        if rest is not None:
+            item['scored'] += 1
+            item['scored_correct'] += correct
+            item['rest_sum'] += rest
+            item['rest_sq_sum'] += rest * rest
+            item['rest_correct_sum'] += rest * correct
+
+    def flush(self):
+        """Add pending answers to the shared file and pick up other writers'"""
+        with self._mutex:
+            if not self._pending:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self.lock.acquire(exclusive=True):
+                items = self._read()
+                add_items(items, self._pending)
+                atomic_write_json(self.path, {'items': items}, separators=(',', ':'))
+            self._items = items
+            self._pending = {}
+            self._pending_answers = 0
+
+    def refresh(self):
+        """Re-read the shared file, keeping answers not yet flushed"""
+        with self._mutex:
+            with self.lock.acquire(exclusive=False):
+                items = self._read()
+            add_items(items, self._pending)
+            self._items = items
+
+    def close(self):
+        """Flush pending answers"""
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def get(self, question_id, correct_answer=None):
+        """
+        Get the statistics of one question
+
+        Returns:
+            Dict from item_report, or None if it has never been answered
+        """
+        with self._mutex:
+            sums = self._items.get(question_id)
+            return item_report(sums, correct_answer) if sums else None
+
+    def question_ids(self):
+        """Get the ID of every question answered at least once"""
+        with self._mutex:
+            return list(self._items)
+
+    def flagged(self, correct_answers=None, min_attempts=20, min_p=0.2, max_p=0.95,
+                min_discrimination=0.1):
+        """
+        Find questions whose statistics suggest they need an author's look
+
+        Args:
+            correct_answers: Optional dict of question ID -> correct option
+            min_attempts: Ignore questions answered fewer times than this
+            min_p: Flag questions fewer than this share get right
+            max_p: Flag questions more than this share get right
+            min_discrimination: Flag a point-biserial below this (a negative
+                value usually means a wrong answer key)
+
+        Returns:
+            Dict of question ID -> report with a 'reasons' list
+        """
+        correct_answers = correct_answers or {}
+        flagged = {}
+        with self._mutex:
+            items = list(self._items.items())
+
+        for question_id, sums in items:
+            if sums['attempts'] < min_attempts:
+                continue
+            report = item_report(sums, correct_answers.get(question_id))
+            reasons = []
+            if report['p_value'] < min_p:
+                reasons.append('too hard')
+            if report['p_value'] > max_p:
+                reasons.append('too easy')
+            if report['point_biserial'] is not None and \
+                    report['point_biserial'] < min_discrimination:
+                reasons.append('low discrimination')
+            if correct_answers.get(question_id) and report['top_distractor'] and \
+                    report['option_counts'].get(report['top_distractor'], 0) > \
+                    report['option_counts'].get(correct_answers[question_id], 0):
+                reasons.append('distractor chosen more than the key')
+            if reasons:
+                flagged[question_id] = dict(report, reasons=reasons)
+        return flagged
@@ -0,0 +1,171 @@
+"""
+On-disk passage corpus with a metadata index and lazily read text
+"""
+
+import hashlib
+import json
+import mmap
+import os
+
+from progress_storage import atomic_write_json
+
+# The passages/ directory of this project, unless READING_PASSAGES_DIR is set
+DEFAULT_CORPUS_DIR = os.environ.get(
+    'READING_PASSAGES_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'passages')
+)
+
+FRONT_MATTER_FIELDS = ('id', 'title', 'grade', 'type')
+FRONT_MATTER_DELIMITER = b'---'
+
+
+def parse_front_matter(f, name='<passage>'):
+    """
+    Read the front matter at the start of a passage file
+
+    A passage file starts with a block of `key: value` lines between two
+    `---` lines; the passage text follows it:
+
+        ---
+        id: g3_1
+        title: The Mystery of the Missing Books
+        grade: 3
+        type: story
+        ---
+        Emma loved her school library...
+
+    Args:
+        f: File opened in binary mode, positioned at the start
+        name: File name used in error messages
+
+    Returns:
+        (metadata dict, byte offset of the passage text)
+
+    Raises:
+        ValueError: If the front matter is missing, unterminated or lacks
+            one of FRONT_MATTER_FIELDS
+    """
+    if f.readline().rstrip() != FRONT_MATTER_DELIMITER:
+        raise ValueError(f"{name}: missing front matter")
+
+    metadata = {}
+    for line in f:
+        line = line.rstrip()
+        if line == FRONT_MATTER_DELIMITER:
+            break
+        if not line:
+            continue
+        key, sep, value = line.decode('utf-8').partition(':')
+        if not sep:
+            raise ValueError(f"{name}: invalid front matter line {line!r}")
+        metadata[key.strip()] = value.strip()
+    else:
+        raise ValueError(f"{name}: unterminated front matter")
+
+    missing = [field for field in FRONT_MATTER_FIELDS if not metadata.get(field)]
+    if missing:
+        raise ValueError(f"{name}: front matter lacks {', '.join(missing)}")
+    metadata['grade'] = metadata['grade'].upper()
+    return metadata, f.tell()
+
+
+class PassageCorpus:
+    """A directory of passage files, read as little as possible
+
+    Startup only builds the metadata index: the front matter of every file
+    with the byte offset of its text. The index is cached in INDEX_FILE
+    and reused for every file whose size and modification time are
+    unchanged, so a warm start only lists and stats the directory.
+    Passage text is read the first time it is asked for, optionally
+    through mmap, so memory use follows the passages actually read.
+    version hashes the index, so it changes whenever a file does.
+    """
+
+    INDEX_FILE = '.index.json'
+    EXTENSIONS = ('.md', '.txt')
+
+    def __init__(self, directory, use_mmap=False):
+        self.directory = directory
+        self.use_mmap = use_mmap
+        self.records = []
+        self.version = None
+        self._files = {}
+        self._load_index()
+
+    def _index_path(self):
+        """Get the path of the cached metadata index"""
+        return os.path.join(self.directory, self.INDEX_FILE)
+
+    def _read_cached_index(self):
+        """Read the cached index, or an empty one if missing or unreadable"""
+        try:
+            with open(self._index_path(), 'r') as f:
+                return json.load(f).get('files', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _load_index(self):
+        """Build the metadata index, reparsing only new or changed files"""
+        if not os.path.isdir(self.directory):
+            return
+
+        cached = self._read_cached_index()
+        files = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(self.EXTENSIONS):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            entry = cached.get(name)
+            if entry is None or entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    metadata, offset = parse_front_matter(f, name)
+                entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                         'metadata': metadata, 'offset': offset}
+            files[name] = entry
+
+        ids = {}
+        for name, entry in files.items():
+            passage_id = entry['metadata']['id']
+            if passage_id in ids:
+                raise ValueError(f"Passage ID {passage_id!r} is used by both "
+                                 f"{ids[passage_id]} and {name}")
+            ids[passage_id] = name
+            self.records.append(entry['metadata'])
+        self._files = {passage_id: (name, files[name]['offset'])
+                       for passage_id, name in ids.items()}
+        self.version = hashlib.sha1(json.dumps(files, sort_keys=True).encode()).hexdigest()
+
+        if files != cached:
+            self._write_index(files)
+
+    def _write_index(self, files):
+        """Cache the metadata index; a read-only corpus just goes uncached"""
+        try:
+            atomic_write_json(self._index_path(), {'files': files}, separators=(',', ':'))
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.records)
+
+    def read_text(self, passage_id):
+        """
+        Read the text of one passage from disk
+
+        Returns:
+            The passage text
+
+        Raises:
+            KeyError: If the corpus has no passage with this ID
+        """
+        name, offset = self._files[passage_id]
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            if self.use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    data = m[offset:]
+            else:
+                f.seek(offset)
+                data = f.read()
+        text = data.decode('utf-8')
+        # The file ends with a newline that is not part of the passage
+        return text[:-1] if text.endswith('\n') else text
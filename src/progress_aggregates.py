@@ -0,0 +1,120 @@
+"""
+Running aggregates over recorded reading sessions
+"""
+
+from trends import TrendBuckets
+
+
+def new_overall_stats():
+    """Create an empty overall stats structure"""
+    return {
+        'total_passages_read': 0,
+        'total_questions_answered': 0,
+        'total_correct': 0,
+        'passages_by_grade': {
+            'K': 0, '1': 0, '2': 0, '3': 0, '4': 0, '5': 0
+        }
+    }
+
+
+def apply_session_stats(stats, session):
+    """Add a session's counts to an overall stats structure"""
+    stats['total_passages_read'] += 1
+    stats['total_questions_answered'] += session['total_questions']
+    stats['total_correct'] += session['correct_answers']
+    by_grade = stats['passages_by_grade']
+    by_grade[session['grade']] = by_grade.get(session['grade'], 0) + 1
+
+
+def summarize_by_type(results):
+    """Count [correct, total] answers per question type"""
+    by_type = {}
+    for result in results:
+        counts = by_type.setdefault(result['question_type'], [0, 0])
+        counts[1] += 1
+        if result['correct']:
+            counts[0] += 1
+    return by_type
+
+
+def session_by_type(session):
+    """Get a session's per-type counts, deriving them for older records"""
+    if 'by_type' in session:
+        return session['by_type']
+    return summarize_by_type(session.get('results', []))
+
+
+class ProgressAggregates:
+    """Totals that are updated as each session is recorded
+
+    Every progress query (overall stats, per-grade totals, per-question-type
+    totals and the daily/weekly trend buckets) is answered from these
+    counters instead of re-summing the session history.
+    """
+
+    def __init__(self):
+        self.stats = new_overall_stats()
+        self.grades = {}
+        self.question_types = {}
+        self.session_count = 0
+        # origin -> highest sequence number seen from it (see sync)
+        self.origins = {}
+        self.trends = TrendBuckets()
+
+    def add(self, session):
+        """Fold one session into the running totals"""
+        apply_session_stats(self.stats, session)
+
+        grade = self.grades.setdefault(session['grade'], {
+            'passages_read': 0, 'total_questions': 0, 'total_correct': 0
+        })
+        grade['passages_read'] += 1
+        grade['total_questions'] += session['total_questions']
+        grade['total_correct'] += session['correct_answers']
+
+        by_type = session_by_type(session)
+        for type_name, (correct, total) in by_type.items():
+            q_type = self.question_types.setdefault(
+                type_name, {'correct': 0, 'total': 0}
+            )
+            q_type['correct'] += correct
+            q_type['total'] += total
+
+        self.session_count += 1
+        self.trends.add(session, by_type)
+
+        origin = session.get('origin')
+        if origin is not None and session['seq'] > self.origins.get(origin, 0):
+            self.origins[origin] = session['seq']
+
+    def to_dict(self):
+        """Get the running totals as a JSON-serializable dict"""
+        return {
+            'stats': self.stats,
+            'grades': self.grades,
+            'question_types': self.question_types,
+            'session_count': self.session_count,
+            'origins': self.origins,
+            'trends': self.trends.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restore running totals saved with to_dict"""
+        aggregates = cls()
+        aggregates.stats = data['stats']
+        aggregates.grades = data['grades']
+        aggregates.question_types = data['question_types']
+        aggregates.session_count = data['session_count']
+        aggregates.origins = data['origins']
+        aggregates.trends = TrendBuckets.from_dict(data['trends'])
+        return aggregates
+
+    def grade_summary(self, grade):
+        """Get passage/question/correct totals for one grade, or None"""
+        summary = self.grades.get(grade)
+        return dict(summary) if summary else None
+
+    def type_summary(self):
+        """Get correct/total counts for every question type seen"""
+        return {q_type: dict(counts) for q_type, counts in self.question_types.items()}
@@ -0,0 +1,91 @@
+"""
+Versioned layout of stored progress records and the steps between versions
+"""
+
+import hashlib
+
+from progress_aggregates import summarize_by_type
+
+# Version of the record layout written into every file header.
+#   1: summaries without 'id' or 'by_type', full evaluation results inline
+#   2: every summary has an 'id' and 'by_type'; detail entries are slim
+SCHEMA_VERSION = 2
+
+# (record kind, version) -> step upgrading a record from that version
+MIGRATIONS = {}
+
+
+def migration(kind, from_version):
+    """Register a step that upgrades one kind of record by one version"""
+    def register(step):
+        MIGRATIONS[(kind, from_version)] = step
+        return step
+    return register
+
+
+def migrate_record(kind, record, version):
+    """
+    Upgrade one stored record to SCHEMA_VERSION
+
+    Steps run in order and must be deterministic, because records in older
+    files are upgraded again each time they are read.
+
+    Args:
+        kind: 'session' (a session summary) or 'detail' (per-question results)
+        record: The record as read from disk
+        version: Schema version of the file it came from
+
+    Returns:
+        The upgraded record
+    """
+    while version < SCHEMA_VERSION:
+        step = MIGRATIONS.get((kind, version))
+        if step is not None:
+            record = step(record)
+        version += 1
+    return record
+
+
+def _slim_results(results):
+    """
+    Keep only what the tracker stores for each answered question
+
+    Explanations and feedback are dropped only where the question_id
+    resolves in the QuestionBank, which can supply them again; any other
+    answer is kept as it was, so its text is not lost.
+    """
+    from questions import QuestionBank
+
+    slim = []
+    for r in results:
+        if QuestionBank.get_question_by_id(r.get('question_id')) is None:
+            slim.append(dict(r))
+            continue
+        slim.append({
+            'question_id': r['question_id'],
+            'answer': r.get('answer'),
+            'correct': r['correct'],
+            'question_type': r['question_type']
+        })
+    return slim
+
+
+@migration('session', 1)
+def _add_session_id_and_types(session):
+    """Give old sessions a stable ID, per-type counts and slim inline results"""
+    session = dict(session)
+    if 'id' not in session:
+        key = '|'.join(str(session.get(field)) for field in ('date', 'passage_id', 'passage_title'))
+        session['id'] = 'legacy-' + hashlib.md5(key.encode()).hexdigest()[:16]
+    if 'results' in session:
+        results = session['results']
+        if 'by_type' not in session:
+            session['by_type'] = summarize_by_type(results)
+        session['results'] = _slim_results(results)
+    return session
+
+
+@migration('detail', 1)
+def _slim_detail(results):
+    """Drop feedback and explanations the QuestionBank can supply again"""
+    return _slim_results(results)
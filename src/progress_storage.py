@@ -0,0 +1,1728 @@
+"""
+Storage drivers for student progress data
+"""
+
+import atexit
+import gzip
+import hashlib
+import itertools
+import json
+import lzma
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import urllib.parse
+import uuid
+from datetime import datetime, timedelta
+
+from file_lock import FileLock
+from progress_aggregates import ProgressAggregates, new_overall_stats, session_by_type
+from progress_schema import SCHEMA_VERSION, migrate_record
+from serializers import get_serializer, read_file_header
+from trends import PERIODS, bucket_key, new_bucket
+
+
+def atomic_write_bytes(path, data):
+    """
+    Replace a file atomically
+
+    The data is written to a temporary file in the same directory, fsynced
+    and renamed over the target, so readers and crashes only ever see the
+    old or the new file, never a truncated one.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def location_id(path):
+    """
+    Identify a file or directory on this machine
+
+    The host and the absolute path are hashed together, so every copy of a
+    store or progress file gets its own ID, even on the same machine.
+    """
+    key = f'{socket.gethostname()}:{uuid.getnode()}:{os.path.abspath(path)}'
+    return hashlib.md5(key.encode()).hexdigest()[:12]
+
+
+def atomic_write_json(path, data, **dump_options):
+    """Replace a JSON file atomically (see atomic_write_bytes)"""
+    atomic_write_bytes(path, json.dumps(data, **dump_options).encode())
+
+
+def file_stamp(path):
+    """Identify the current version of a file, or None if it is missing"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class ProgressStorage:
+    """Interface implemented by every progress storage driver"""
+
+    def append_sessions(self, sessions):
+        """
+        Persist completed sessions, oldest first
+
+        A session may carry its per-question detail under 'results'; drivers
+        store that detail apart from the session summary so that listing
+        sessions never loads it.
+        """
+        raise NotImplementedError
+
+    def session_results(self, session):
+        """Load the per-question detail of one session, or None"""
+        raise NotImplementedError
+
+    def iter_sessions(self):
+        """Yield every stored session, oldest first"""
+        raise NotImplementedError
+
+    def iter_sessions_with_results(self, where=None):
+        """
+        Yield (session, per-question detail or None), oldest first
+
+        Args:
+            where: Only yield sessions for which where(session) is true
+        """
+        for session in self.iter_sessions():
+            if where is None or where(session):
+                yield session, self.session_results(session)
+
+    def iter_archived_sessions(self):
+        """Yield sessions moved to the cold archive, oldest first"""
+        return iter(())
+
+    def session_ids(self):
+        """Get the set of IDs of every stored session"""
+        return {session.get('id') for session in self.iter_sessions()}
+
+    def archive(self):
+        """Move sessions older than the archive age to the cold archive"""
+
+    def migrate(self):
+        """Rewrite stored data of an older schema version; returns a count"""
+        return 0
+
+    def prune(self):
+        """Apply the retention policy now instead of in the background"""
+
+    def _stamp_origin(self, sessions, seq):
+        """
+        Give sessions recorded here this storage's origin and sequence numbers
+
+        Sessions that already have an origin (received by sync) keep it.
+
+        Args:
+            sessions: Sessions about to be appended
+            seq: Highest sequence number already used by this origin
+        """
+        stamped = []
+        for session in sessions:
+            if 'origin' not in session:
+                seq += 1
+                session = dict(session, origin=self.origin, seq=seq)
+            stamped.append(session)
+        return stamped
+
+    def sync_vector(self):
+        """Get the highest sequence number stored from each origin"""
+        raise NotImplementedError
+
+    def iter_sessions_since(self, position):
+        """Yield (position, session) for sessions appended at or after a position"""
+        raise NotImplementedError
+
+    def count_sessions(self):
+        """Get the number of stored sessions"""
+        raise NotImplementedError
+
+    def overall_stats(self):
+        """Get raw overall counts (passages, questions, correct, by grade)"""
+        raise NotImplementedError
+
+    def recent_sessions(self, limit):
+        """Get the most recent sessions, oldest first"""
+        raise NotImplementedError
+
+    def grade_summary(self, grade):
+        """Get passage/question/correct totals for one grade, or None"""
+        raise NotImplementedError
+
+    def type_summary(self):
+        """Get correct/total counts for every question type answered"""
+        raise NotImplementedError
+
+    def trend_buckets(self, period):
+        """Get the daily or weekly trend buckets, keyed by start date"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Write any buffered state to disk"""
+
+    def close(self):
+        """Release any resources held by the driver"""
+        self.flush()
+
+
+class JSONLogStorage(ProgressStorage):
+    """Default driver: an append-only session log plus a stats header
+
+    Sessions are appended as one record each to a log next to the data
+    file, and the data file itself only holds a small JSON stats header.
+    Recording a session appends one record to the log, so its cost does not
+    grow with the length of the history. Queries are answered from running
+    aggregates.
+
+    Once the log holds compact_threshold sessions it is compacted: the log
+    is renamed to an immutable segment file and a snapshot of the
+    aggregates plus the most recent sessions is written. Startup reads only
+    the snapshot and the current log; segments are read only when the full
+    history is iterated.
+
+    Per-question detail is appended to a separate details file, one file
+    per segment, and each session summary keeps a [segment, offset]
+    reference to it so the detail can be read with a single seek.
+
+    Log, segment, details and snapshot files are written with the
+    configured serializer (see serializers.SERIALIZERS) and start with a
+    header naming it, so files written in any supported format can be read.
+    A log in a different format or schema version from the configured one
+    is compacted away before the next write. Records from files of an
+    older schema are upgraded as they are read (see progress_schema), and
+    migrate() rewrites old segments in the background.
+
+    Segments whose newest session is older than archive_after_days are
+    compressed (gzip or lzma) into immutable archive files, together with
+    their details files. Archived sessions are still counted by every
+    query and read transparently by iter_sessions and
+    iter_archived_sessions; the hot files stay the same size however long
+    the history grows.
+
+    An optional retention policy bounds what a long-lived account keeps:
+    sessions older than detail_retention_days lose their detail reference
+    (a segment holding only such sessions is rewritten as summaries only
+    and its details file deleted; in a segment that also holds newer
+    sessions the file stays until they expire too), and the oldest
+    sessions beyond max_sessions are dropped. Running aggregates are
+    never reduced, so statistics and trends still cover the full history.
+    Pruning and archiving run after each compaction, once the write lock is
+    released, and pruning rewrites at most PRUNE_REWRITES segments at a
+    time; prune() runs it to completion.
+
+    Every session recorded here is stamped with the storage's origin and
+    the next sequence number of that origin; the running aggregates keep
+    the highest sequence number seen per origin, so sync can tell which
+    sessions a peer is missing without reading the history.
+
+    Several processes may share the same files. Every write happens under
+    an exclusive advisory lock and first merges whatever other processes
+    appended since this one last looked (merge-on-write); reads merge under
+    a shared lock, so no process ever overwrites another's sessions.
+    Recovery and upgrades found while loading are only written back under
+    the exclusive lock; under the shared one they are served from memory.
+
+    With read_only set the files are only ever read under the shared lock:
+    nothing is recovered, upgraded or written on disk (beyond the lock
+    file), and every method that would write raises ValueError.
+    """
+
+    LOG_SUFFIX = '.sessions.jsonl'
+    SNAPSHOT_SUFFIX = '.snapshot.json'
+    LOCK_SUFFIX = '.lock'
+    SEGMENT_PATTERN = '.seg-{:06d}.jsonl'
+    DETAILS_PATTERN = '.details-{:06d}.jsonl'
+    ARCHIVE_FORMATS = {
+        'gzip': ('.gz', gzip.open),
+        'lzma': ('.xz', lzma.open)
+    }
+    PRUNE_REWRITES = 4
+
+    def __init__(self, data_file='data/user_progress.json', student='default',
+                 compact_threshold=500, tail_size=50, serializer='json',
+                 archive_after_days=30, archive_format='gzip',
+                 detail_retention_days=None, max_sessions=None, origin=None,
+                 read_only=False):
+        if archive_format not in self.ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {archive_format}")
+
+        self.data_file = data_file
+        self.student = student
+        self.compact_threshold = compact_threshold
+        self.tail_size = tail_size
+        self.serializer = get_serializer(serializer)
+        self.archive_after_days = archive_after_days
+        self.archive_format = archive_format
+        self.detail_retention_days = detail_retention_days
+        self.max_sessions = max_sessions
+        self.origin = origin or location_id(data_file)
+        self.read_only = read_only
+
+        base = os.path.splitext(data_file)[0]
+        self.log_file = base + self.LOG_SUFFIX
+        self.snapshot_file = base + self.SNAPSHOT_SUFFIX
+        self.lock = FileLock(base + self.LOCK_SUFFIX)
+
+        # Set by a compaction; pruning and archiving run once the lock is released
+        self._maintenance_due = False
+        self._reset_state()
+        if os.path.isdir(os.path.dirname(data_file) or '.'):
+            with self.lock.acquire(exclusive=not read_only):
+                self._load()
+
+    def _reset_state(self):
+        """Forget everything loaded from disk"""
+        self.sessions = []
+        self.recent = []
+        self.segments = []
+        self.aggregates = ProgressAggregates()
+        self._log_offset = 0
+        self._log_serializer = None
+        self._log_schema = SCHEMA_VERSION
+        self._snapshot_stamp = None
+        # Segments numbered up to this were dropped by the retention policy
+        self.pruned_through = 0
+
+    def _load(self):
+        """Load the snapshot and replay the sessions logged since it"""
+        header = self._read_json(self.data_file)
+
+        # Older installs kept every session inside the data file itself
+        if header and 'sessions' in header:
+            self._migrate_legacy_sessions(header['sessions'])
+
+        self._snapshot_stamp = file_stamp(self.snapshot_file)
+        snapshot, schema = self._read_document(self.snapshot_file)
+        if snapshot:
+            self.aggregates = ProgressAggregates.from_dict(snapshot['aggregates'])
+            self.segments = snapshot['segments']
+            self.pruned_through = snapshot.get('pruned_through', 0)
+            self.recent = [migrate_record('session', session, schema)
+                           for session in snapshot['recent']]
+
+        # A segment that is not in the snapshot was compacted just before a
+        # crash; fold it in now so its sessions are not lost. An archived
+        # segment's original may outlive a crash during archiving.
+        listed = {self._plain_name(segment['file']) for segment in self.segments}
+        recovered = False
+        for name in self._segment_names():
+            if self._segment_number(name) <= self.pruned_through:
+                # Dropped by the retention policy just before a crash
+                if self.lock.exclusive:
+                    self._remove_segment_files(name)
+            elif name not in listed:
+                self.segments.append(self._replay_segment(name))
+                recovered = True
+        if recovered and self.lock.exclusive:
+            self._write_snapshot()
+
+        self._merge_log_tail()
+
+    def _merge_log_tail(self):
+        """Fold in sessions appended to the log since it was last read"""
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'rb') as f:
+            if self._log_serializer is None:
+                self._log_serializer, self._log_schema, self._log_offset = read_file_header(f)
+            f.seek(self._log_offset)
+            for session, size in self._log_serializer.iter_records(f):
+                self._log_offset += size
+                if session is not None:
+                    session = migrate_record('session', session, self._log_schema)
+                    self.sessions.append(session)
+                    self.aggregates.add(session)
+
+    def _refresh(self):
+        """Merge changes made by other processes; call with the lock held"""
+        log_size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        if file_stamp(self.snapshot_file) != self._snapshot_stamp or \
+                log_size < self._log_offset:
+            # Another process compacted the log; start from its snapshot
+            self._reset_state()
+            self._load()
+        elif log_size > self._log_offset:
+            self._merge_log_tail()
+
+    @staticmethod
+    def _read_json(path):
+        """Read a JSON document, or None if it is missing or unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _read_document(path):
+        """
+        Read a single-record file such as the snapshot
+
+        Returns:
+            (document or None, schema version of the file)
+        """
+        if not os.path.exists(path):
+            return None, SCHEMA_VERSION
+        with open(path, 'rb') as f:
+            serializer, schema, _ = read_file_header(f)
+            for document, _ in serializer.iter_records(f):
+                return document, schema
+        return None, schema
+
+    @classmethod
+    def _open_segment_file(cls, path):
+        """Open a segment or details file for reading, archived or not"""
+        for suffix, opener in cls.ARCHIVE_FORMATS.values():
+            if path.endswith(suffix):
+                return opener(path, 'rb')
+        return open(path, 'rb')
+
+    @classmethod
+    def _plain_name(cls, name):
+        """Strip the archive suffix from a segment or details file name"""
+        for suffix, _ in cls.ARCHIVE_FORMATS.values():
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+        return name
+
+    @classmethod
+    def _read_records(cls, path):
+        """Yield sessions from a log or segment file"""
+        if not os.path.exists(path):
+            return
+        with cls._open_segment_file(path) as f:
+            serializer, schema, _ = read_file_header(f)
+            for session, _ in serializer.iter_records(f):
+                if session is not None:
+                    yield migrate_record('session', session, schema)
+
+    def _segment_path(self, name):
+        """Get the full path of a segment file"""
+        return os.path.join(os.path.dirname(self.data_file), name)
+
+    def _segment_names(self):
+        """List segment file names on disk, oldest first"""
+        base = os.path.basename(os.path.splitext(self.data_file)[0])
+        prefix, suffix = base + '.seg-', '.jsonl'
+        directory = os.path.dirname(self.data_file) or '.'
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory)
+                      if name.startswith(prefix) and name.endswith(suffix))
+
+    def _replay_segment(self, name):
+        """Fold a segment's sessions into the aggregates and recent tail"""
+        count = 0
+        first_date = last_date = None
+        for session in self._read_records(self._segment_path(name)):
+            self.aggregates.add(session)
+            self.recent.append(session)
+            first_date = first_date or session['date']
+            last_date = session['date']
+            count += 1
+        self.recent = self.recent[-self.tail_size:]
+        return {'file': name, 'sessions': count,
+                'first_date': first_date, 'last_date': last_date}
+
+    @classmethod
+    def _segment_number(cls, name):
+        """Get the sequence number from a segment file name"""
+        return int(cls._plain_name(name)[-12:-6])
+
+    def _details_path(self, number):
+        """Get the path of the details file paired with a segment number"""
+        return os.path.splitext(self.data_file)[0] + self.DETAILS_PATTERN.format(number)
+
+    def _find_details_path(self, number):
+        """Get the details file of a segment, archived or not, or None"""
+        path = self._details_path(number)
+        candidates = [path] + [path + suffix for suffix, _ in self.ARCHIVE_FORMATS.values()]
+        for candidate in candidates:
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _compress_file(self, path):
+        """
+        Write a compressed copy of a file to a temporary file next to it
+
+        Returns:
+            Path of the temporary copy; rename it to the path plus the
+            archive suffix to put it in place
+        """
+        _, opener = self.ARCHIVE_FORMATS[self.archive_format]
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+        os.close(fd)
+        try:
+            with open(path, 'rb') as src, opener(tmp_path, 'wb') as dst:
+                while True:
+                    chunk = src.read(1 << 20)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _archive(self):
+        """
+        Archive segments past the archive age; call without the lock held
+
+        Each segment (and its details file) is compressed while no lock is
+        held, so other processes keep writing meanwhile. The copies are
+        then swapped in under the exclusive lock, unless the segment was
+        rewritten, pruned or archived by someone else in the meantime.
+        """
+        if self.archive_after_days is None:
+            return
+
+        cutoff = (datetime.now() - timedelta(days=self.archive_after_days)).isoformat()
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            due = [segment['file'] for segment in self.segments
+                   if not segment.get('archived') and segment['last_date'] is not None
+                   and segment['last_date'] < cutoff]
+
+        suffix, _ = self.ARCHIVE_FORMATS[self.archive_format]
+        for name in due:
+            originals = [self._segment_path(name),
+                         self._details_path(self._segment_number(name))]
+            stamps = [file_stamp(path) for path in originals]
+            copies = []
+            try:
+                try:
+                    for path, stamp in zip(originals, stamps):
+                        copies.append(self._compress_file(path) if stamp else None)
+                except FileNotFoundError:
+                    # Archived or pruned by another process meanwhile
+                    continue
+                with self.lock.acquire(exclusive=True):
+                    self._refresh()
+                    segment = next((segment for segment in self.segments
+                                    if segment['file'] == name), None)
+                    if segment is None or stamps[0] is None or \
+                            [file_stamp(path) for path in originals] != stamps:
+                        continue
+                    for path, copy in zip(originals, copies):
+                        if copy is not None:
+                            os.replace(copy, path + suffix)
+                    segment['file'] = name + suffix
+                    segment['archived'] = True
+                    # The snapshot must point at the archives before the originals go
+                    self._save_snapshot()
+                    for path, copy in zip(originals, copies):
+                        if copy is not None:
+                            os.remove(path)
+            finally:
+                for copy in copies:
+                    if copy is not None and os.path.exists(copy):
+                        os.remove(copy)
+
+    def _current_segment_number(self):
+        """Number the current log will get when it is compacted"""
+        if not self.segments:
+            return 1
+        return self._segment_number(self.segments[-1]['file']) + 1
+
+    def _migrate_legacy_sessions(self, sessions):
+        """Move sessions from an old single-document file into the log"""
+        sessions = [migrate_record('session', session, 1) for session in sessions]
+        if not self.lock.exclusive:
+            # Serve them from memory; their detail is still inline
+            if not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0:
+                for session in sessions:
+                    self.sessions.append(session)
+                    self.aggregates.add(session)
+            return
+        if not os.path.exists(self.log_file) or os.path.getsize(self.log_file) == 0:
+            summaries = self._write_details(sessions)
+            self._write_log(summaries)
+            # The log offset is now past these sessions; load them here
+            for session in summaries:
+                self.sessions.append(session)
+                self.aggregates.add(session)
+
+        aggregates = ProgressAggregates()
+        for session in sessions:
+            aggregates.add(session)
+        self._write_header(aggregates.stats)
+
+    def _open_for_append(self, path):
+        """
+        Open a log or details file for appending in the configured format
+
+        Returns:
+            The open binary file, or None if the file already holds records
+            in a different format or schema version
+        """
+        f = open(path, 'a+b')
+        if f.tell() == 0:
+            f.write(self.serializer.file_header())
+            return f
+
+        f.seek(0)
+        serializer, schema, _ = read_file_header(f)
+        f.seek(0, os.SEEK_END)
+        if serializer.name != self.serializer.name or schema != SCHEMA_VERSION:
+            f.close()
+            return None
+        return f
+
+    def _write_details(self, sessions):
+        """
+        Append per-question detail to the current details file
+
+        Returns:
+            The session summaries, each with a 'detail' reference in place
+            of its 'results' list
+        """
+        self._ensure_data_dir()
+        number = self._current_segment_number()
+        f = self._open_for_append(self._details_path(number))
+        if f is None:
+            # The details file is in another format or schema; start a new segment
+            self._compact(force=True)
+            number = self._current_segment_number()
+            f = self._open_for_append(self._details_path(number))
+
+        summaries = []
+        with f:
+            offset = f.tell()
+            for session in sessions:
+                summary = dict(session)
+                results = summary.pop('results', None)
+                if results is not None:
+                    record = self.serializer.encode_record(results)
+                    f.write(record)
+                    summary['detail'] = [number, offset]
+                    offset += len(record)
+                summaries.append(summary)
+            f.flush()
+            os.fsync(f.fileno())
+        return summaries
+
+    def _write_log(self, sessions):
+        """Append sessions to the log in the configured format"""
+        self._ensure_data_dir()
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > self._log_offset:
+            # Drop a record cut short by an interrupted write
+            with open(self.log_file, 'r+b') as f:
+                f.truncate(self._log_offset)
+
+        f = self._open_for_append(self.log_file)
+        if f is None:
+            # The log is in another format or schema; move it into a segment first
+            self._compact(force=True)
+            f = self._open_for_append(self.log_file)
+
+        with f:
+            for session in sessions:
+                f.write(self.serializer.encode_record(session))
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+        self._log_serializer = self.serializer
+        self._log_schema = SCHEMA_VERSION
+
+    def _write_header(self, stats):
+        """Write the small stats header that sits alongside the log"""
+        self._ensure_data_dir()
+        header = {
+            'format': 'session-log',
+            'serializer': self.serializer.name,
+            'schema': SCHEMA_VERSION,
+            'log_file': os.path.basename(self.log_file),
+            'overall_stats': stats
+        }
+        atomic_write_json(self.data_file, header, indent=2)
+
+    def _write_snapshot(self):
+        """Write the aggregates, segment list and recent tail"""
+        self._ensure_data_dir()
+        snapshot = {
+            'segments': self.segments,
+            'pruned_through': self.pruned_through,
+            'aggregates': self.aggregates.to_dict(),
+            'recent': self.recent
+        }
+        atomic_write_bytes(
+            self.snapshot_file,
+            self.serializer.file_header() + self.serializer.encode_record(snapshot)
+        )
+        self._snapshot_stamp = file_stamp(self.snapshot_file)
+
+    def _save_snapshot(self):
+        """
+        Write the snapshot outside a compaction; call with the exclusive lock held
+
+        Snapshot aggregates cover compacted sessions only, so sessions
+        other processes logged since are compacted first.
+        """
+        if self.sessions:
+            self._compact()
+        else:
+            self._write_snapshot()
+
+    def _ensure_data_dir(self):
+        """Ensure the data directory exists"""
+        self._check_writable()
+        data_dir = os.path.dirname(self.data_file)
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+
+    def _check_writable(self):
+        """Refuse to write through a storage opened read-only"""
+        if self.read_only:
+            raise ValueError(f"{self.data_file} is opened read-only")
+
+    def compact(self):
+        """Move the current log into a new segment and write a snapshot"""
+        self._check_writable()
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            self._compact()
+        self._maintain()
+
+    def _compact(self, force=False):
+        """
+        Compact the log; call with the exclusive lock held
+
+        Args:
+            force: Start a new segment even if the log holds no sessions
+        """
+        if not self.sessions and not force:
+            return
+
+        number = self._current_segment_number()
+        name = os.path.basename(os.path.splitext(self.data_file)[0]) + \
+            self.SEGMENT_PATTERN.format(number)
+        if os.path.exists(self.log_file):
+            os.replace(self.log_file, self._segment_path(name))
+        else:
+            with open(self._segment_path(name), 'wb') as f:
+                f.write(self.serializer.file_header())
+        self._log_offset = 0
+        self._log_serializer = None
+
+        self.segments.append({
+            'file': name,
+            'sessions': len(self.sessions),
+            'first_date': self.sessions[0]['date'] if self.sessions else None,
+            'last_date': self.sessions[-1]['date'] if self.sessions else None
+        })
+        self.recent = (self.recent + self.sessions)[-self.tail_size:]
+        self.sessions = []
+        self._write_snapshot()
+        self._maintenance_due = True
+
+    def _maintain(self):
+        """
+        Prune and archive after a compaction, once the write lock is released
+
+        Pruning takes the lock on its own and rewrites at most
+        PRUNE_REWRITES segments; archiving compresses without the lock (see
+        _archive). Neither holds up the write that triggered it.
+        """
+        if not self._maintenance_due:
+            return
+        self._maintenance_due = False
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            self._prune(self.PRUNE_REWRITES)
+        self._archive()
+
+    def archive(self):
+        """Compress segments whose sessions are older than archive_after_days"""
+        self._check_writable()
+        self._archive()
+
+    def _migrate_segment(self, segment):
+        """
+        Rewrite one segment in the current schema; call with the lock held
+
+        Records are streamed from the old file into a temporary file that
+        then replaces it, so memory use does not depend on segment size.
+        Details files are left alone and upgraded as they are read, so the
+        [segment, offset] references stay valid.
+
+        Returns:
+            True if the segment was rewritten
+        """
+        path = self._segment_path(segment['file'])
+        if not os.path.exists(path):
+            return False
+        with self._open_segment_file(path) as f:
+            _, schema, _ = read_file_header(f)
+        if schema >= SCHEMA_VERSION:
+            return False
+        self._rewrite_segment(path, self._read_records(path))
+        return True
+
+    def _rewrite_segment(self, path, sessions):
+        """
+        Replace a segment file with the given sessions in the current format
+
+        Sessions are streamed into a temporary file that then replaces the
+        segment, so memory use does not depend on segment size. An archived
+        segment stays compressed.
+        """
+        opener = open
+        for suffix, archive_opener in self.ARCHIVE_FORMATS.values():
+            if path.endswith(suffix):
+                opener = archive_opener
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+        os.close(fd)
+        try:
+            with opener(tmp_path, 'wb') as dst:
+                dst.write(self.serializer.file_header())
+                for session in sessions:
+                    dst.write(self.serializer.encode_record(session))
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove_segment_files(self, name):
+        """Delete a segment file and its details file, archived or not"""
+        for path in (self._segment_path(name),
+                     self._find_details_path(self._segment_number(name))):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _summary_only(session):
+        """Strip a session of its per-question detail"""
+        return {key: value for key, value in session.items()
+                if key not in ('results', 'detail')}
+
+    def _strip_details(self, sessions, cutoff, kept):
+        """Strip the detail of sessions older than cutoff, noting the dates of the rest in kept"""
+        for session in sessions:
+            if 'results' in session or 'detail' in session:
+                if session['date'] < cutoff:
+                    session = self._summary_only(session)
+                else:
+                    kept.append(session['date'])
+            yield session
+
+    def _prune(self, max_rewrites=None):
+        """
+        Apply the retention policy; call with the exclusive lock held
+
+        Args:
+            max_rewrites: Most segments to strip of detail in this call
+                (all of them if None)
+        """
+        dropped, details = [], []
+        rewrites = 0
+
+        if self.max_sessions is not None:
+            excess = sum(segment['sessions'] for segment in self.segments) + \
+                len(self.sessions) - self.max_sessions
+            while excess > 0 and self.segments:
+                segment = self.segments[0]
+                if segment['sessions'] <= excess:
+                    self.segments.pop(0)
+                    self.pruned_through = self._segment_number(segment['file'])
+                    dropped.append(segment['file'])
+                    excess -= segment['sessions']
+                    continue
+                # Keep the newest sessions of the oldest segment; their
+                # [segment, offset] detail references stay valid
+                path = self._segment_path(segment['file'])
+                self._rewrite_segment(path, itertools.islice(self._read_records(path), excess, None))
+                segment['sessions'] -= excess
+                segment['first_date'] = next(self._read_records(path))['date']
+                rewrites += 1
+                excess = 0
+            compacted = sum(segment['sessions'] for segment in self.segments)
+            self.recent = self.recent[max(len(self.recent) - compacted, 0):]
+
+        if self.detail_retention_days is not None:
+            cutoff = (datetime.now() - timedelta(days=self.detail_retention_days)).isoformat()
+            for segment in self.segments:
+                if max_rewrites is not None and rewrites >= max_rewrites:
+                    break
+                # detail_from: date of the oldest session that still has detail
+                if segment.get('summary_only') or segment['last_date'] is None or \
+                        segment.get('detail_from', segment['first_date']) >= cutoff:
+                    continue
+                path = self._segment_path(segment['file'])
+                kept = []
+                self._rewrite_segment(path, self._strip_details(self._read_records(path), cutoff, kept))
+                if kept:
+                    segment['detail_from'] = min(kept)
+                else:
+                    segment.pop('detail_from', None)
+                    segment['summary_only'] = True
+                    details.append(self._find_details_path(self._segment_number(segment['file'])))
+                rewrites += 1
+            self.recent = list(self._strip_details(self.recent, cutoff, []))
+
+        if dropped or rewrites:
+            # The snapshot must stop pointing at files before they go
+            self._save_snapshot()
+            for name in dropped:
+                self._remove_segment_files(name)
+            for path in details:
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+
+    def prune(self):
+        """Apply the retention policy to every segment now"""
+        self._check_writable()
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            if self.max_sessions is not None and self.sessions and \
+                    sum(segment['sessions'] for segment in self.segments) + \
+                    len(self.sessions) > self.max_sessions:
+                # Sessions can only be dropped from segments
+                self._compact()
+            self._prune()
+
+    def migrate(self):
+        """
+        Rewrite every file of an older schema, one segment at a time
+
+        The lock is only held while one segment is rewritten, so other
+        processes keep recording sessions during the migration.
+
+        Returns:
+            Number of segment files rewritten
+        """
+        self._check_writable()
+        if not os.path.exists(self.data_file):
+            return 0
+
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            if self.sessions and self._log_schema < SCHEMA_VERSION:
+                self._compact()
+            names = [self._plain_name(segment['file']) for segment in self.segments]
+
+        rewritten = 0
+        for name in names:
+            with self.lock.acquire(exclusive=True):
+                self._refresh()
+                # Other processes may have archived or pruned it meanwhile
+                segment = next((segment for segment in self.segments
+                                if self._plain_name(segment['file']) == name), None)
+                if segment is not None and self._migrate_segment(segment):
+                    rewritten += 1
+
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            _, schema = self._read_document(self.snapshot_file)
+            if schema < SCHEMA_VERSION:
+                # The snapshot only covers compacted sessions, so fold the
+                # log in first; its recent tail was upgraded on load
+                if self.sessions:
+                    self._compact()
+                else:
+                    self._write_snapshot()
+            self._write_header(self.aggregates.stats)
+        return rewritten
+
+    def append_sessions(self, sessions):
+        """Merge other writers' sessions, then append ours under the lock"""
+        self._ensure_data_dir()
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+
+            sessions = self._stamp_origin(sessions, self.aggregates.origins.get(self.origin, 0))
+            sessions = self._write_details(sessions)
+            self._write_log(sessions)
+            for session in sessions:
+                self.sessions.append(session)
+                self.aggregates.add(session)
+
+            if len(self.sessions) >= self.compact_threshold:
+                self._compact()
+            self._write_header(self.aggregates.stats)
+        self._maintain()
+
+    def refresh(self):
+        """Pick up sessions recorded by other processes"""
+        with self.lock.acquire(exclusive=False):
+            if os.path.isdir(os.path.dirname(self.data_file) or '.'):
+                self._refresh()
+
+    def session_results(self, session):
+        """Read one session's per-question detail with a single seek"""
+        if 'results' in session:
+            # Older records kept their detail inline
+            return session['results']
+        if 'detail' not in session:
+            return None
+
+        number, offset = session['detail']
+        path = self._find_details_path(number)
+        if path is None:
+            return None
+        with self._open_segment_file(path) as f:
+            serializer, schema, _ = read_file_header(f)
+            f.seek(offset)
+            for results, _ in serializer.iter_records(f):
+                return migrate_record('detail', results, schema)
+        return None
+
+    def iter_segment_sessions(self):
+        """Yield compacted sessions, reading segment files on demand"""
+        for segment in self.segments:
+            yield from self._read_records(self._segment_path(segment['file']))
+
+    def iter_sessions(self):
+        """Yield every stored session, oldest first"""
+        self.refresh()
+        segments, sessions = list(self.segments), list(self.sessions)
+        for segment in segments:
+            yield from self._read_records(self._segment_path(segment['file']))
+        yield from sessions
+
+    def iter_sessions_with_results(self, where=None):
+        """
+        Yield (session, per-question detail or None), oldest first
+
+        Each details file is opened once and read front to back as its
+        sessions come up, so an archived one is decompressed once instead
+        of once per session.
+
+        Args:
+            where: Only yield sessions for which where(session) is true
+        """
+        number, f, serializer, schema = None, None, None, None
+        try:
+            for session in self.iter_sessions():
+                if where is not None and not where(session):
+                    continue
+                if 'results' in session:
+                    # Older records kept their detail inline
+                    yield session, session['results']
+                    continue
+                if 'detail' not in session:
+                    yield session, None
+                    continue
+
+                if session['detail'][0] != number:
+                    if f is not None:
+                        f.close()
+                        f = None
+                    number = session['detail'][0]
+                    path = self._find_details_path(number)
+                    if path is not None:
+                        f = self._open_segment_file(path)
+                        serializer, schema, _ = read_file_header(f)
+
+                results = None
+                if f is not None:
+                    # Offsets grow within a file, so this only seeks forward
+                    f.seek(session['detail'][1])
+                    for results, _ in serializer.iter_records(f):
+                        results = migrate_record('detail', results, schema)
+                        break
+                yield session, results
+        finally:
+            if f is not None:
+                f.close()
+
+    def iter_sessions_since(self, position):
+        """
+        Yield (position, session) for sessions appended at or after a position
+
+        Positions count every session ever appended here, pruned ones
+        included, so segments before the position are skipped unread.
+        """
+        self.refresh()
+        segments, sessions = list(self.segments), list(self.sessions)
+        index = self.aggregates.session_count - len(sessions) - \
+            sum(segment['sessions'] for segment in segments)
+        for segment in segments:
+            if index + segment['sessions'] <= position:
+                index += segment['sessions']
+                continue
+            for session in self._read_records(self._segment_path(segment['file'])):
+                if index >= position:
+                    yield index, session
+                index += 1
+        for session in sessions:
+            if index >= position:
+                yield index, session
+            index += 1
+
+    def sync_vector(self):
+        """Get the highest sequence number stored from each origin"""
+        self.refresh()
+        return dict(self.aggregates.origins)
+
+    def iter_archived_sessions(self):
+        """Yield sessions from the compressed archive segments, oldest first"""
+        self.refresh()
+        for segment in list(self.segments):
+            if segment.get('archived'):
+                yield from self._read_records(self._segment_path(segment['file']))
+
+    def count_sessions(self):
+        """Get the number of stored sessions"""
+        self.refresh()
+        return self.aggregates.session_count
+
+    def overall_stats(self):
+        """Get raw overall counts"""
+        self.refresh()
+        return self.aggregates.stats
+
+    def recent_sessions(self, limit):
+        """Get the most recent sessions, oldest first"""
+        if limit <= 0:
+            return []
+        self.refresh()
+        recent = self.recent + self.sessions
+        if limit > len(recent) and len(recent) < self.aggregates.session_count:
+            # Asking for more than the snapshot tail keeps in memory
+            recent = list(self.iter_sessions())
+        return recent[-limit:]
+
+    def grade_summary(self, grade):
+        """Get passage/question/correct totals for one grade, or None"""
+        self.refresh()
+        return self.aggregates.grade_summary(grade)
+
+    def type_summary(self):
+        """Get correct/total counts for every question type answered"""
+        self.refresh()
+        return self.aggregates.type_summary()
+
+    def trend_buckets(self, period):
+        """Get the daily or weekly trend buckets, keyed by start date"""
+        self.refresh()
+        return self.aggregates.trends.get(period)
+
+    def flush(self):
+        """Write the stats header; sessions are already in the log"""
+        if self.read_only or \
+                not os.path.exists(self.data_file) and not self.aggregates.session_count:
+            return
+        with self.lock.acquire(exclusive=True):
+            self._refresh()
+            self._write_header(self.aggregates.stats)
+
+
+class SQLiteStorage(ProgressStorage):
+    """SQLite driver with indexed per-student queries
+
+    All students can share one database file; every query is keyed by
+    student and served from an index on (student, date), (student, grade)
+    or (student, passage_id) instead of a scan over the whole history.
+    Per-question detail goes into question_results, so a session's answers
+    are only read when asked for.
+
+    Running totals per grade and per question type are kept in the totals
+    table, upserted as sessions are inserted, so the summaries read a
+    handful of rows instead of grouping the history.
+
+    With a retention policy, question_results rows of sessions older than
+    detail_retention_days and the oldest sessions beyond max_sessions are
+    deleted after each write. The totals are never reduced, so statistics
+    still cover the full history.
+
+    Sessions carry the origin and sequence number they were recorded with,
+    and sync_origins keeps the highest sequence number per origin (pruning
+    never lowers it).
+
+    With read_only set an existing database is opened read-only and is
+    not upgraded, so reading it never writes or creates anything; writes
+    fail with sqlite3.OperationalError.
+    """
+
+    PRUNE_CHUNK = 500
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT NOT NULL,
+            student TEXT NOT NULL,
+            date TEXT NOT NULL,
+            grade TEXT NOT NULL,
+            passage_id TEXT NOT NULL,
+            passage_title TEXT NOT NULL,
+            total_questions INTEGER NOT NULL,
+            correct_answers INTEGER NOT NULL,
+            accuracy REAL NOT NULL,
+            by_type TEXT NOT NULL,
+            origin TEXT,
+            seq INTEGER,
+            UNIQUE (student, uid)
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_student_date
+            ON sessions (student, date, id);
+        CREATE INDEX IF NOT EXISTS idx_sessions_student_grade
+            ON sessions (student, grade, date);
+        CREATE INDEX IF NOT EXISTS idx_sessions_student_passage
+            ON sessions (student, passage_id, date);
+        CREATE TABLE IF NOT EXISTS question_results (
+            session_id INTEGER NOT NULL REFERENCES sessions (id),
+            student TEXT NOT NULL,
+            question_id TEXT,
+            answer TEXT,
+            question_type TEXT NOT NULL,
+            correct INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_results_session
+            ON question_results (session_id);
+        CREATE TABLE IF NOT EXISTS totals (
+            student TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            sessions INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (student, dimension, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS sync_origins (
+            student TEXT NOT NULL,
+            origin TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (student, origin)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS retention (
+            student TEXT PRIMARY KEY,
+            details_before TEXT NOT NULL,
+            last_session INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        -- Daily and weekly trend buckets, upserted as sessions are inserted;
+        -- dimension is '' for the overall bucket, 'grade' or 'type'
+        CREATE TABLE IF NOT EXISTS trend_buckets (
+            student TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            sessions INTEGER NOT NULL,
+            accuracy_sum REAL NOT NULL,
+            correct INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (student, period, bucket, dimension, key)
+        ) WITHOUT ROWID;
+    """
+
+    COLUMNS = ('uid', 'date', 'grade', 'passage_id', 'passage_title',
+               'total_questions', 'correct_answers', 'accuracy', 'by_type', 'origin', 'seq')
+
+    def __init__(self, data_file='data/user_progress.db', student='default',
+                 detail_retention_days=None, max_sessions=None, origin=None,
+                 read_only=False):
+        self.data_file = data_file
+        self.student = student
+        self.detail_retention_days = detail_retention_days
+        self.max_sessions = max_sessions
+        self.origin = origin or location_id(data_file)
+        self.read_only = read_only
+
+        if read_only:
+            uri = f'file:{urllib.parse.quote(os.path.abspath(data_file))}?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False)
+            return
+
+        data_dir = os.path.dirname(data_file)
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+
+        # WAL lets readers run while another process writes; the busy
+        # timeout makes concurrent writers queue up instead of failing
+        self.conn = sqlite3.connect(data_file, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _trend_rows(session, by_type):
+        """Get the bucket increments one session contributes"""
+        for period in PERIODS:
+            bucket = bucket_key(session['date'], period)
+            yield (period, bucket, '', '', 1, session['accuracy'],
+                   session['correct_answers'], session['total_questions'])
+            yield (period, bucket, 'grade', session['grade'], 1, session['accuracy'], 0, 0)
+            for type_name, (correct, total) in by_type.items():
+                yield (period, bucket, 'type', type_name, 0, 0, correct, total)
+
+    def _add_trends(self, student, session, by_type):
+        """Upsert one session's trend bucket increments"""
+        self.conn.executemany(
+            "INSERT INTO trend_buckets (student, period, bucket, dimension, key, "
+            "sessions, accuracy_sum, correct, total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (student, period, bucket, dimension, key) DO UPDATE SET "
+            "sessions = sessions + excluded.sessions, "
+            "accuracy_sum = accuracy_sum + excluded.accuracy_sum, "
+            "correct = correct + excluded.correct, "
+            "total = total + excluded.total",
+            [(student,) + row for row in self._trend_rows(session, by_type)]
+        )
+
+    def _row_to_session(self, row):
+        """Convert a result row into the session dict used by the tracker"""
+        session = dict(zip(self.COLUMNS, row))
+        session['id'] = session.pop('uid')
+        session['by_type'] = json.loads(session['by_type'])
+        return session
+
+    def _select(self, where='', params=(), order='ASC', limit=None):
+        """Select sessions for this student in date order"""
+        sql = (f"SELECT {', '.join(self.COLUMNS)} FROM sessions "
+               f"WHERE student = ? {where} ORDER BY date {order}, id {order}")
+        params = (self.student,) + tuple(params)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        return self.conn.execute(sql, params)
+
+    def append_sessions(self, sessions):
+        """Insert sessions and their question detail in one transaction"""
+        with self.conn:
+            # Take the write lock first so concurrent writers cannot reuse a sequence number
+            self.conn.execute("BEGIN IMMEDIATE")
+            vector = self.sync_vector()
+            for s in self._stamp_origin(sessions, vector.get(self.origin, 0)):
+                by_type = session_by_type(s)
+                cursor = self.conn.execute(
+                    "INSERT INTO sessions (uid, student, date, grade, passage_id, "
+                    "passage_title, total_questions, correct_answers, accuracy, "
+                    "by_type, origin, seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (s['id'], self.student, s['date'], s['grade'],
+                     s['passage_id'], s['passage_title'], s['total_questions'],
+                     s['correct_answers'], s['accuracy'],
+                     json.dumps(by_type, separators=(',', ':')), s['origin'], s['seq'])
+                )
+                self.conn.execute(
+                    "INSERT INTO sync_origins (student, origin, seq) VALUES (?, ?, ?) "
+                    "ON CONFLICT (student, origin) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                    (self.student, s['origin'], s['seq'])
+                )
+                self._add_totals(s, by_type)
+                self._add_trends(self.student, s, by_type)
+                self.conn.executemany(
+                    "INSERT INTO question_results (session_id, student, "
+                    "question_id, answer, question_type, correct) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, self.student, r.get('question_id'),
+                      r.get('answer'), r['question_type'], int(r['correct']))
+                     for r in s.get('results', [])]
+                )
+        self._prune()
+
+    def _add_totals(self, session, by_type):
+        """Upsert one session's grade and question-type totals"""
+        rows = [('grade', session['grade'], 1,
+                 session['correct_answers'], session['total_questions'])]
+        rows.extend(('type', type_name, 0, correct, total)
+                    for type_name, (correct, total) in by_type.items())
+        self.conn.executemany(
+            "INSERT INTO totals (student, dimension, key, sessions, correct, total) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (student, dimension, key) DO UPDATE SET "
+            "sessions = sessions + excluded.sessions, "
+            "correct = correct + excluded.correct, "
+            "total = total + excluded.total",
+            [(self.student,) + row for row in rows]
+        )
+
+    def _prune_rows(self, ids, drop_sessions):
+        """Delete sessions' detail (and the sessions); the totals keep their counts"""
+        for start in range(0, len(ids), self.PRUNE_CHUNK):
+            chunk = ids[start:start + self.PRUNE_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            self.conn.execute(f"DELETE FROM question_results WHERE session_id IN ({marks})", chunk)
+            if drop_sessions:
+                self.conn.execute(f"DELETE FROM sessions WHERE id IN ({marks})", chunk)
+
+    def _prune(self):
+        """Apply the retention policy to what this student gained since the last run"""
+        if self.max_sessions is None and self.detail_retention_days is None:
+            return
+        with self.conn:
+            if self.max_sessions is not None:
+                ids = [row[0] for row in self.conn.execute(
+                    "SELECT id FROM sessions WHERE student = ? "
+                    "ORDER BY date DESC, id DESC LIMIT -1 OFFSET ?",
+                    (self.student, self.max_sessions)
+                )]
+                self._prune_rows(ids, drop_sessions=True)
+
+            if self.detail_retention_days is not None:
+                cutoff = (datetime.now() - timedelta(days=self.detail_retention_days)).isoformat()
+                details_before, last_session = self.conn.execute(
+                    "SELECT details_before, last_session FROM retention WHERE student = ?",
+                    (self.student,)
+                ).fetchone() or ('', 0)
+                # Older sessions lost their detail in an earlier run, unless
+                # they were inserted (e.g. imported) after it
+                ids = {row[0] for row in self.conn.execute(
+                    "SELECT id FROM sessions WHERE student = ? AND date >= ? AND date < ?",
+                    (self.student, details_before, cutoff)
+                )}
+                ids.update(row[0] for row in self.conn.execute(
+                    "SELECT id FROM sessions WHERE student = ? AND id > ? AND date < ?",
+                    (self.student, last_session, cutoff)
+                ))
+                self._prune_rows(sorted(ids), drop_sessions=False)
+                self.conn.execute(
+                    "INSERT INTO retention (student, details_before, last_session) "
+                    "SELECT ?, ?, COALESCE(MAX(id), 0) FROM sessions WHERE true "
+                    "ON CONFLICT (student) DO UPDATE SET "
+                    "details_before = excluded.details_before, "
+                    "last_session = excluded.last_session",
+                    (self.student, cutoff)
+                )
+
+    def prune(self):
+        """Apply the retention policy now"""
+        self._prune()
+
+    def sync_vector(self):
+        """Get the highest sequence number stored from each origin"""
+        return dict(self.conn.execute(
+            "SELECT origin, seq FROM sync_origins WHERE student = ?", (self.student,)
+        ).fetchall())
+
+    def iter_sessions_since(self, position):
+        """
+        Yield (position, session) for sessions inserted at or after a position
+
+        Positions are row IDs, which only grow, so this is one range scan.
+        """
+        rows = self.conn.execute(
+            f"SELECT id, {', '.join(self.COLUMNS)} FROM sessions "
+            "WHERE student = ? AND id >= ? ORDER BY id",
+            (self.student, position)
+        )
+        for row in rows:
+            yield row[0], self._row_to_session(row[1:])
+
+    def _totals(self, dimension):
+        """Get the (key, sessions, correct, total) rows of one dimension"""
+        return self.conn.execute(
+            "SELECT key, sessions, correct, total FROM totals "
+            "WHERE student = ? AND dimension = ?",
+            (self.student, dimension)
+        ).fetchall()
+
+    def session_results(self, session):
+        """Read one session's per-question detail"""
+        rows = self.conn.execute(
+            "SELECT r.question_id, r.answer, r.correct, r.question_type "
+            "FROM question_results r JOIN sessions s ON s.id = r.session_id "
+            "WHERE s.student = ? AND s.uid = ? ORDER BY r.rowid",
+            (self.student, session['id'])
+        ).fetchall()
+        if not rows:
+            return None
+        return [{'question_id': question_id, 'answer': answer,
+                 'correct': bool(correct), 'question_type': question_type}
+                for question_id, answer, correct, question_type in rows]
+
+    def iter_sessions(self):
+        """Yield every stored session, oldest first"""
+        for row in self._select():
+            yield self._row_to_session(row)
+
+    def session_ids(self):
+        """Get the set of IDs of every stored session from the student index"""
+        return {uid for (uid,) in self.conn.execute(
+            "SELECT uid FROM sessions WHERE student = ?", (self.student,)
+        )}
+
+    def count_sessions(self):
+        """Get the number of recorded sessions, including pruned ones"""
+        return sum(sessions for _, sessions, _, _ in self._totals('grade'))
+
+    def overall_stats(self):
+        """Get raw overall counts from the per-grade totals"""
+        stats = new_overall_stats()
+        for grade, passages, correct, questions in self._totals('grade'):
+            stats['total_passages_read'] += passages
+            stats['total_questions_answered'] += questions
+            stats['total_correct'] += correct
+            stats['passages_by_grade'][grade] = passages
+        return stats
+
+    def recent_sessions(self, limit):
+        """Get the most recent sessions, oldest first"""
+        rows = self._select(order='DESC', limit=limit).fetchall()
+        return [self._row_to_session(row) for row in reversed(rows)]
+
+    def grade_summary(self, grade):
+        """Get passage/question/correct totals for one grade, or None"""
+        row = self.conn.execute(
+            "SELECT sessions, total, correct FROM totals "
+            "WHERE student = ? AND dimension = 'grade' AND key = ?",
+            (self.student, grade)
+        ).fetchone()
+        if row is None:
+            return None
+
+        passages, questions, correct = row
+        return {
+            'passages_read': passages,
+            'total_questions': questions,
+            'total_correct': correct
+        }
+
+    def type_summary(self):
+        """Get correct/total counts per question type from the totals"""
+        return {q_type: {'correct': correct, 'total': total}
+                for q_type, _, correct, total in self._totals('type')}
+
+    def trend_buckets(self, period):
+        """Get the daily or weekly trend buckets from the bucket table"""
+        rows = self.conn.execute(
+            "SELECT bucket, dimension, key, sessions, accuracy_sum, correct, total "
+            "FROM trend_buckets WHERE student = ? AND period = ?",
+            (self.student, period)
+        )
+        buckets = {}
+        for key, dimension, name, sessions, accuracy_sum, correct, total in rows:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = new_bucket()
+            if dimension == 'grade':
+                bucket['grades'][name] = [sessions, accuracy_sum]
+            elif dimension == 'type':
+                bucket['types'][name] = [correct, total]
+            else:
+                bucket.update(sessions=sessions, accuracy_sum=accuracy_sum,
+                              correct=correct, questions=total)
+        return buckets
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+
+class WriteBehindStorage(ProgressStorage):
+    """Wraps another driver so that recording a session never waits on disk
+
+    Sessions are queued in memory and a background thread hands them to the
+    wrapped driver in batches, either once max_batch sessions are waiting or
+    every flush_interval seconds. Reads flush the queue first so they always
+    see every recorded session. The queue is flushed when the wrapper is
+    closed and, via atexit, when the interpreter exits.
+
+    If the wrapped driver fails (a full disk, a locked database, ...), the
+    batch stays queued and the flusher retries it every flush_interval;
+    the error is kept in last_error and raised by the next flush() or
+    close(), so it is never swallowed.
+    """
+
+    def __init__(self, storage, flush_interval=1.0, max_batch=50):
+        self.storage = storage
+        self.data_file = storage.data_file
+        self.student = storage.student
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.last_error = None
+
+        self._pending = []
+        self._closed = False
+        self._cond = threading.Condition()
+        self._io_lock = threading.RLock()
+
+        self._thread = threading.Thread(
+            target=self._run, name='progress-flusher', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        """Background loop that flushes on the size or time threshold"""
+        failed = False
+        while True:
+            with self._cond:
+                if not self._closed and (failed or len(self._pending) < self.max_batch):
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            if closed:
+                # close() writes what is left and reports any error
+                return
+            try:
+                self.flush()
+                failed = False
+            except Exception as e:
+                # The batch stays queued; try again on the next tick
+                self.last_error = e
+                failed = True
+
+    def append_sessions(self, sessions):
+        """Queue sessions for the background flusher"""
+        with self._cond:
+            if self._closed:
+                raise ValueError("Cannot record sessions on closed storage")
+            self._pending.extend(sessions)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """
+        Write every queued session to the wrapped driver now
+
+        Raises:
+            The wrapped driver's error if the queue cannot be written; the
+            sessions stay queued for the next attempt
+        """
+        with self._io_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self.storage.append_sessions(batch)
+            except BaseException:
+                with self._cond:
+                    self._pending[:0] = batch
+                raise
+            self.last_error = None
+
+    def iter_sessions(self):
+        """Yield every stored session, including queued ones"""
+        self.flush()
+        return self.storage.iter_sessions()
+
+    def iter_sessions_with_results(self, where=None):
+        """Yield stored sessions with their detail, including queued ones"""
+        self.flush()
+        return self.storage.iter_sessions_with_results(where)
+
+    def session_ids(self):
+        """Get the IDs of every stored session, including queued ones"""
+        self.flush()
+        return self.storage.session_ids()
+
+    def count_sessions(self):
+        """Get the number of stored sessions, including queued ones"""
+        self.flush()
+        return self.storage.count_sessions()
+
+    def overall_stats(self):
+        """Get raw overall counts, including queued sessions"""
+        self.flush()
+        return self.storage.overall_stats()
+
+    def recent_sessions(self, limit):
+        """Get the most recent sessions, including queued ones"""
+        self.flush()
+        return self.storage.recent_sessions(limit)
+
+    def grade_summary(self, grade):
+        """Get totals for one grade, including queued sessions"""
+        self.flush()
+        return self.storage.grade_summary(grade)
+
+    def type_summary(self):
+        """Get per-question-type counts, including queued sessions"""
+        self.flush()
+        return self.storage.type_summary()
+
+    def session_results(self, session):
+        """Load one session's detail, including queued sessions"""
+        self.flush()
+        return self.storage.session_results(session)
+
+    def trend_buckets(self, period):
+        """Get trend buckets, including queued sessions"""
+        self.flush()
+        return self.storage.trend_buckets(period)
+
+    def iter_archived_sessions(self):
+        """Yield archived sessions from the wrapped driver"""
+        return self.storage.iter_archived_sessions()
+
+    def archive(self):
+        """Write queued sessions, then archive old ones in the wrapped driver"""
+        self.flush()
+        self.storage.archive()
+
+    def migrate(self):
+        """Write queued sessions, then migrate the wrapped driver's files"""
+        self.flush()
+        return self.storage.migrate()
+
+    def prune(self):
+        """Write queued sessions, then apply the wrapped driver's retention policy"""
+        self.flush()
+        self.storage.prune()
+
+    def sync_vector(self):
+        """Write queued sessions, then read the wrapped driver's sync vector"""
+        self.flush()
+        return self.storage.sync_vector()
+
+    def iter_sessions_since(self, position):
+        """Write queued sessions, then read from the wrapped driver"""
+        self.flush()
+        return self.storage.iter_sessions_since(position)
+
+    def close(self):
+        """Stop the flusher, write everything queued and close the driver"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        atexit.unregister(self.close)
+        try:
+            self.flush()
+        finally:
+            self.storage.close()
+
+
+STORAGE_DRIVERS = {
+    'json': JSONLogStorage,
+    'sqlite': SQLiteStorage
+}
+
+
+def create_storage(driver='json', data_file=None, write_behind=False, **options):
+    """
+    Create a storage driver by name
+
+    Args:
+        driver: Key in STORAGE_DRIVERS ('json' or 'sqlite')
+        data_file: Path of the driver's data file (driver default if None)
+        write_behind: Wrap the driver in a WriteBehindStorage
+        **options: Extra driver options, e.g. student, or serializer for JSON
+
+    Returns:
+        ProgressStorage instance
+    """
+    if driver not in STORAGE_DRIVERS:
+        raise ValueError(f"Unknown storage driver: {driver}")
+
+    storage_class = STORAGE_DRIVERS[driver]
+    if data_file is not None:
+        options['data_file'] = data_file
+    storage = storage_class(**options)
+
+    if write_behind:
+        storage = WriteBehindStorage(storage)
+    return storage
@@ -0,0 +1,217 @@
+"""
+Student-keyed progress store for classroom and district deployments
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from class_rollups import ClassRollups
+from item_stats import ItemStatsIndex
+from progress_tracker import ProgressTracker
+
+
+class ProgressStore:
+    """Keeps each student's progress in its own partition
+
+    With the JSON driver every student gets a directory of their own under
+    root_dir, spread over 256 shard directories so no single directory
+    grows too large. With the SQLite driver the students of a shard share
+    one database file, partitioned by the student column. Either way,
+    loading or saving one student never reads anyone else's data.
+
+    At most max_open trackers are kept open at once; the least recently
+    used one is flushed and closed when another student is opened, so
+    memory stays bounded however many students the store holds. A tracker
+    held through open_tracker is not closed while it is held: it leaves
+    the LRU and is closed when its last holder is done.
+
+    All students share one item statistics index (item_stats.json under
+    root_dir), so question statistics cover the whole store, and one set
+    of class and school rollups (see ClassRollups).
+
+    detail_retention_days and max_sessions set a retention policy applied
+    to every student (see JSONLogStorage and SQLiteStorage).
+    """
+
+    STUDENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$')
+
+    def __init__(self, root_dir='data/students', driver='json', max_open=128,
+                 write_behind=False, detail_retention_days=None, max_sessions=None):
+        self.root_dir = root_dir
+        self.driver = driver
+        self.max_open = max_open
+        self.write_behind = write_behind
+        self.detail_retention_days = detail_retention_days
+        self.max_sessions = max_sessions
+
+        self.item_stats = ItemStatsIndex(os.path.join(root_dir, 'item_stats.json'))
+        self.rollups = ClassRollups(root_dir)
+
+        self._trackers = OrderedDict()
+        self._holds = {}
+        self._evicted = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def validate_student_id(cls, student_id):
+        """Check that a student ID is safe to use as a file name"""
+        if not student_id or not cls.STUDENT_ID_PATTERN.match(student_id):
+            raise ValueError(
+                f"Invalid student ID: {student_id!r} "
+                "(use letters, digits, '.', '_' or '-', up to 64 characters)"
+            )
+        return student_id
+
+    @staticmethod
+    def shard_for(student_id):
+        """Get the two-hex-digit shard a student belongs to"""
+        return hashlib.md5(student_id.encode()).hexdigest()[:2]
+
+    def student_path(self, student_id):
+        """Get the data file that holds a student's progress"""
+        self.validate_student_id(student_id)
+        shard = self.shard_for(student_id)
+        if self.driver == 'sqlite':
+            return os.path.join(self.root_dir, f'{shard}.db')
+        return os.path.join(self.root_dir, shard, student_id, 'progress.json')
+
+    def get_tracker(self, student_id):
+        """
+        Get the tracker for one student, opening it if necessary
+
+        The tracker is closed once max_open other students have been
+        opened since it was last used, so code that may run alongside
+        other threads using the store should hold it with open_tracker.
+
+        Args:
+            student_id: Student identifier
+
+        Returns:
+            ProgressTracker bound to the student's partition
+        """
+        with self._lock:
+            tracker = self._trackers.get(student_id)
+            if tracker is not None:
+                self._trackers.move_to_end(student_id)
+                return tracker
+
+            # Evicted while held: keep using the open tracker
+            tracker = self._evicted.pop(student_id, None)
+            if tracker is None:
+                tracker = ProgressTracker(
+                    self.student_path(student_id),
+                    driver=self.driver,
+                    student=student_id,
+                    write_behind=self.write_behind,
+                    item_stats=self.item_stats,
+                    rollups=self.rollups,
+                    detail_retention_days=self.detail_retention_days,
+                    max_sessions=self.max_sessions
+                )
+            self._trackers[student_id] = tracker
+
+            evicted = []
+            while len(self._trackers) > self.max_open:
+                evicted.append(self._discard(*self._trackers.popitem(last=False)))
+        for stale in evicted:
+            if stale is not None:
+                stale.close()
+        return tracker
+
+    @contextmanager
+    def open_tracker(self, student_id):
+        """
+        Hold one student's tracker, so it is not closed while in use
+
+        Yields:
+            ProgressTracker bound to the student's partition
+        """
+        with self._lock:
+            tracker = self.get_tracker(student_id)
+            self._holds[student_id] = self._holds.get(student_id, 0) + 1
+        try:
+            yield tracker
+        finally:
+            with self._lock:
+                self._holds[student_id] -= 1
+                if self._holds[student_id]:
+                    tracker = None
+                else:
+                    del self._holds[student_id]
+                    tracker = self._evicted.pop(student_id, None)
+            if tracker is not None:
+                tracker.close()
+
+    def _discard(self, student_id, tracker):
+        """Take a tracker out of the LRU, returning it if it should be closed now"""
+        if self._holds.get(student_id):
+            self._evicted[student_id] = tracker
+            return None
+        return tracker
+
+    def has_student(self, student_id):
+        """Check whether any progress has been stored for a student"""
+        path = self.student_path(student_id)
+        if self.driver != 'sqlite':
+            return os.path.isdir(os.path.dirname(path))
+        if not os.path.exists(path):
+            return False
+        conn = sqlite3.connect(path)
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM sessions WHERE student = ? LIMIT 1", (student_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        finally:
+            conn.close()
+        return row is not None
+
+    def iter_student_ids(self):
+        """Yield the ID of every student with stored progress"""
+        if not os.path.isdir(self.root_dir):
+            return
+
+        for entry in sorted(os.listdir(self.root_dir)):
+            path = os.path.join(self.root_dir, entry)
+            if self.driver == 'sqlite':
+                if not entry.endswith('.db'):
+                    continue
+                conn = sqlite3.connect(path)
+                try:
+                    rows = conn.execute(
+                        "SELECT DISTINCT student FROM sessions ORDER BY student"
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    rows = []
+                finally:
+                    conn.close()
+                for (student_id,) in rows:
+                    yield student_id
+            elif os.path.isdir(path):
+                yield from sorted(os.listdir(path))
+
+    def close_student(self, student_id):
+        """Flush and close one student's tracker if it is open and not held"""
+        with self._lock:
+            tracker = self._trackers.pop(student_id, None)
+            if tracker is not None:
+                tracker = self._discard(student_id, tracker)
+        if tracker is not None:
+            tracker.close()
+
+    def close(self):
+        """Flush and close every open tracker, held or not"""
+        with self._lock:
+            trackers = list(self._trackers.values()) + list(self._evicted.values())
+            self._trackers.clear()
+            self._evicted.clear()
+        for tracker in trackers:
+            tracker.close()
+        self.item_stats.close()
+        self.rollups.close()
@@ -2,84 +2,191 @@
 Progress tracking system for student performance
 """
 
-import json
 import os
+import threading
+import uuid
+from collections import OrderedDict
 from datetime import datetime
 
+from item_stats import ItemStatsIndex
+from progress_aggregates import summarize_by_type
+from progress_storage import create_storage
+from questions import QuestionBank
+from trends import TrendEngine
+
 
 class ProgressTracker:
-    """Tracks and manages student reading comprehension progress"""
-
-    def __init__(self, data_file='data/user_progress.json'):
-        self.data_file = data_file
-        self.progress_data = self._load_progress()
-
-    def _load_progress(self):
-        """Load progress data from file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return self._create_new_progress_data()
-        return self._create_new_progress_data()
-
-    def _create_new_progress_data(self):
-        """Create new progress data structure"""
-        return {
-            'sessions': [],
-            'overall_stats': {
-                'total_passages_read': 0,
-                'total_questions_answered': 0,
-                'total_correct': 0,
-                'passages_by_grade': {
-                    'K': 0, '1': 0, '2': 0, '3': 0, '4': 0, '5': 0
-                }
-            }
-        }
+    """Tracks and manages student reading comprehension progress
+
+    Sessions are persisted through a pluggable storage driver (see
+    progress_storage.STORAGE_DRIVERS). The JSON session log is the
+    default; 'sqlite' keeps many students in one indexed database. With
+    write_behind=True sessions are queued and written by a background
+    thread, so recording a session does not wait on the disk. Any other
+    keyword arguments (e.g. serializer='orjson') go to the driver.
+
+    Session summaries are what the progress pages list; each session's
+    per-question answers are stored separately as question IDs and answers
+    and loaded on demand through get_session_results. Every answer also
+    updates the per-question item statistics index (item_stats); pass a
+    shared ItemStatsIndex to pool the statistics of many students. When a
+    ClassRollups is given, sessions also update the student's class and
+    school rollups.
+    """
+
+    # How many attempt tokens commit_session remembers in memory
+    COMMITTED_TOKEN_LIMIT = 256
+
+    def __init__(self, data_file=None, driver='json', student='default',
+                 write_behind=False, item_stats=None, rollups=None, **storage_options):
+        self.student = student
+        self.storage = create_storage(driver, data_file, write_behind=write_behind,
+                                      student=student, **storage_options)
+        self.data_file = self.storage.data_file
+
+        self._owns_item_stats = item_stats is None
+        if item_stats is None:
+            item_stats = ItemStatsIndex(
+                os.path.join(os.path.dirname(self.data_file), 'item_stats.json')
+            )
+        self.item_stats = item_stats
+        self.rollups = rollups
+        self.trends = TrendEngine(self.storage)
+
+        self._committed = OrderedDict()
+        self._commit_lock = threading.Lock()
+        # (next storage position, SessionColumns) built by get_analytics
+        self._analytics = (0, None)
+        self._analytics_lock = threading.Lock()
 
     def save_progress(self):
-        """Save progress data to file"""
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        """Save progress data to storage"""
+        self.storage.flush()
+        self.item_stats.flush()
+        if self.rollups is not None:
+            self.rollups.flush()
 
-        with open(self.data_file, 'w') as f:
-            json.dump(self.progress_data, f, indent=2)
+    def close(self):
+        """Flush and release the storage driver"""
+        self.storage.close()
+        if self._owns_item_stats:
+            self.item_stats.close()
+        else:
+            self.item_stats.flush()
+        if self.rollups is not None:
+            self.rollups.flush()
 
-    def record_session(self, grade, passage_id, passage_title, results):
+    @staticmethod
+    def build_session(grade, passage_id, passage_title, results, session_id=None, date=None):
         """
-        Record a completed reading session
+        Build the stored form of a completed reading session
 
         Args:
             grade: Grade level
             passage_id: ID of the passage
             passage_title: Title of the passage
             results: List of question results
+            session_id: ID to store the session under (a new one if None)
+            date: ISO timestamp of the session (now if None)
+
+        Returns:
+            (session summary, per-question detail) pair
         """
         session = {
-            'date': datetime.now().isoformat(),
+            'id': session_id or uuid.uuid4().hex,
+            'date': date or datetime.now().isoformat(),
             'grade': grade,
             'passage_id': passage_id,
             'passage_title': passage_title,
             'total_questions': len(results),
             'correct_answers': sum(1 for r in results if r['correct']),
             'accuracy': (sum(1 for r in results if r['correct']) / len(results) * 100) if results else 0,
-            'results': results
+            'by_type': summarize_by_type(results)
         }
 
-        self.progress_data['sessions'].append(session)
+        # Only IDs and answers are kept; explanations come from the QuestionBank
+        detail = [
+            {
+                'question_id': r.get('question_id'),
+                'answer': r.get('answer'),
+                'correct': r['correct'],
+                'question_type': r['question_type']
+            }
+            for r in results
+        ]
+        return session, detail
+
+    def record_session(self, grade, passage_id, passage_title, results, session_id=None):
+        """
+        Record a completed reading session
+
+        Args:
+            grade: Grade level
+            passage_id: ID of the passage
+            passage_title: Title of the passage
+            results: List of question results
+            session_id: ID to store the session under (a new one if None)
+
+        Returns:
+            The recorded session summary
+        """
+        session, detail = self.build_session(grade, passage_id, passage_title, results, session_id)
+
+        self.storage.append_sessions([dict(session, results=detail)])
+        self.item_stats.record_results(detail)
+        if self.rollups is not None:
+            self.rollups.record(self.student, session)
+        return session
+
+    def record_sessions(self, sessions):
+        """
+        Record a batch of sessions with one storage write
+
+        Args:
+            sessions: (session, detail) pairs from build_session, oldest first
+        """
+        self.storage.append_sessions([dict(session, results=detail) for session, detail in sessions])
+        for session, detail in sessions:
+            self.item_stats.record_results(detail, autoflush=False)
+            if self.rollups is not None:
+                self.rollups.record(self.student, session, autoflush=False)
+        self.item_stats.flush()
+        if self.rollups is not None:
+            self.rollups.flush()
+
+    def commit_session(self, attempt_token, grade, passage_id, passage_title, results):
+        """
+        Record an attempt exactly once, however often it is committed
+
+        The attempt token becomes the session ID. Committing a token that
+        was already recorded returns the stored session without touching
+        the disk, so pages that rerun (like Streamlit's) can commit freely.
+
+        Args:
+            attempt_token: Unique token for this attempt, e.g. uuid4().hex
+            grade, passage_id, passage_title, results: As for record_session
 
-        # Update overall stats
-        self.progress_data['overall_stats']['total_passages_read'] += 1
-        self.progress_data['overall_stats']['total_questions_answered'] += len(results)
-        self.progress_data['overall_stats']['total_correct'] += sum(1 for r in results if r['correct'])
-        self.progress_data['overall_stats']['passages_by_grade'][grade] += 1
+        Returns:
+            The recorded session summary
+        """
+        with self._commit_lock:
+            session = self._committed.get(attempt_token)
+            if session is None:
+                session = next((s for s in self.storage.recent_sessions(20)
+                                if s.get('id') == attempt_token), None)
+            if session is None:
+                session = self.record_session(grade, passage_id, passage_title,
+                                              results, session_id=attempt_token)
 
-        self.save_progress()
+            self._committed[attempt_token] = session
+            self._committed.move_to_end(attempt_token)
+            while len(self._committed) > self.COMMITTED_TOKEN_LIMIT:
+                self._committed.popitem(last=False)
+            return session
 
     def get_overall_stats(self):
         """Get overall statistics"""
-        stats = self.progress_data['overall_stats']
+        stats = self.storage.overall_stats()
 
         if stats['total_questions_answered'] > 0:
             overall_accuracy = (stats['total_correct'] / stats['total_questions_answered']) * 100
@@ -96,47 +203,162 @@ class ProgressTracker:
 
     def get_recent_sessions(self, limit=5):
         """Get recent reading sessions"""
-        sessions = self.progress_data['sessions']
-        return sessions[-limit:] if sessions else []
+        return self.storage.recent_sessions(limit)
+
+    def get_analytics(self):
+        """
+        Get the session history as columnar arrays (see analytics)
+
+        The columns are kept and extended with the sessions stored since
+        the previous call, so only the first call reads the whole history.
+        Like the summaries, they keep sessions that the retention policy
+        drops afterwards.
+        """
+        # Imported here so that numpy is only loaded when analytics are used
+        from analytics import SessionColumns
+
+        with self._analytics_lock:
+            cursor, columns = self._analytics
+
+            def added():
+                nonlocal cursor
+                for position, session in self.storage.iter_sessions_since(cursor):
+                    cursor = position + 1
+                    yield session
+
+            if columns is None:
+                columns = SessionColumns.from_sessions(added(), student=self.storage.student)
+            else:
+                columns = columns.extend(added(), student=self.storage.student)
+            self._analytics = (cursor, columns)
+            return columns
+
+    def iter_archived_sessions(self):
+        """Yield sessions old enough to have been moved to the archive"""
+        return self.storage.iter_archived_sessions()
+
+    def get_session_results(self, session):
+        """
+        Load the per-question results of a recorded session
+
+        Args:
+            session: Session summary from get_recent_sessions
+
+        Returns:
+            List of result dicts with the question text, correct answer and
+            explanation filled in from the QuestionBank, or None if the
+            detail is not available
+        """
+        detail = self.storage.session_results(session)
+        if detail is None:
+            return None
+
+        results = []
+        for entry in detail:
+            result = dict(entry)
+            question = QuestionBank.get_question_by_id(entry.get('question_id'))
+            if question:
+                result.setdefault('question_text', question.text)
+                result.setdefault('correct_answer', question.correct_answer)
+                result.setdefault('explanation', question.explanation)
+            results.append(result)
+        return results
+
+    def get_item_statistics(self, question_id):
+        """
+        Get how a question has performed across every student in the index
+
+        Returns:
+            Dict with attempts, p_value, option_counts, point_biserial and
+            top_distractor, or None if the question was never answered
+        """
+        question = QuestionBank.get_question_by_id(question_id)
+        return self.item_stats.get(question_id, question.correct_answer if question else None)
+
+    def get_flagged_questions(self, **thresholds):
+        """
+        Find questions that look too hard, too easy or badly keyed
+
+        Args:
+            **thresholds: Overrides for ItemStatsIndex.flagged
+
+        Returns:
+            Dict of question ID -> item statistics with a 'reasons' list
+        """
+        correct_answers = {}
+        for question_id in self.item_stats.question_ids():
+            question = QuestionBank.get_question_by_id(question_id)
+            if question:
+                correct_answers[question_id] = question.correct_answer
+        return self.item_stats.flagged(correct_answers, **thresholds)
 
     def get_grade_performance(self, grade):
         """Get performance statistics for a specific grade"""
-        grade_sessions = [s for s in self.progress_data['sessions'] if s['grade'] == grade]
+        summary = self.storage.grade_summary(grade)
 
-        if not grade_sessions:
+        if not summary:
             return None
 
-        total_questions = sum(s['total_questions'] for s in grade_sessions)
-        total_correct = sum(s['correct_answers'] for s in grade_sessions)
+        total_questions = summary['total_questions']
+        total_correct = summary['total_correct']
         avg_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
 
         return {
-            'passages_read': len(grade_sessions),
+            'passages_read': summary['passages_read'],
             'total_questions': total_questions,
             'total_correct': total_correct,
             'average_accuracy': avg_accuracy
         }
 
-    def get_improvement_trend(self):
-        """Analyze if the student is improving over time"""
-        sessions = self.progress_data['sessions']
+    def get_question_type_performance(self):
+        """Get performance statistics for each question type"""
+        type_performance = self.storage.type_summary()
 
-        if len(sessions) < 2:
-            return "Not enough data to determine trend"
+        for stats in type_performance.values():
+            stats['accuracy'] = (stats['correct'] / stats['total']) * 100 if stats['total'] else 0
 
-        # Compare first half vs second half
-        mid_point = len(sessions) // 2
-        first_half = sessions[:mid_point]
-        second_half = sessions[mid_point:]
+        return type_performance
 
-        first_half_avg = sum(s['accuracy'] for s in first_half) / len(first_half)
-        second_half_avg = sum(s['accuracy'] for s in second_half) / len(second_half)
+    # Windows tried in turn by get_improvement_trend: (period, periods, label)
+    TREND_WINDOWS = (
+        ('week', 12, 'over the last 12 weeks'),
+        ('day', 14, 'over the last 14 days'),
+        ('week', None, 'over time')
+    )
 
-        improvement = second_half_avg - first_half_avg
+    def get_improvement_trend(self):
+        """Analyze if the student is improving over time"""
+        for period, window, label in self.TREND_WINDOWS:
+            trend = self.trends.trend(period, window)
+            if trend['change'] is not None:
+                break
+        else:
+            return "Not enough data to determine trend"
+
+        improvement = trend['change']
 
         if improvement > 5:
-            return f"Improving! Accuracy increased by {improvement:.1f}%"
+            return f"Improving! Accuracy increased by {improvement:.1f}% {label}"
         elif improvement < -5:
-            return f"Declining. Accuracy decreased by {abs(improvement):.1f}%"
+            return f"Declining. Accuracy decreased by {abs(improvement):.1f}% {label}"
         else:
             return "Stable performance"
+
+    def get_trend_report(self, weeks=12):
+        """
+        Get rolling accuracy and weekly trends for the progress pages
+
+        Args:
+            weeks: Number of recent weeks the slopes are fitted over
+
+        Returns:
+            Dict with 7- and 30-day accuracy (None without sessions), the
+            weekly slope and per-grade and per-question-type weekly trends
+        """
+        return {
+            'last_7_days': self.trends.rolling_accuracy(7, 'day'),
+            'last_30_days': self.trends.rolling_accuracy(30, 'day'),
+            'weekly_slope': self.trends.slope('week', weeks),
+            'grades': self.trends.grade_trends('week', weeks),
+            'question_types': self.trends.type_trends('week', weeks)
+        }
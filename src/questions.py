@@ -2,6 +2,8 @@
 Question generation and management system
 """
 
+from corpus_bundle import default_bundle
+
 class Question:
     """Represents a single comprehension question"""
 
@@ -554,20 +556,45 @@ class QuestionBank:
         ]
     }
 
+    _QUESTION_INDEX = None
+
+    @staticmethod
+    def _build_question(passage_id, q_data):
+        """Build a Question object from its raw data"""
+        return Question(
+            q_data['id'],
+            passage_id,
+            q_data['type'],
+            q_data['question'],
+            q_data['options'],
+            q_data['answer'],
+            q_data['explanation']
+        )
+
     @classmethod
     def get_questions_for_passage(cls, passage_id):
         """Get all questions for a specific passage"""
-        questions_data = cls.QUESTIONS.get(passage_id, [])
-        questions = []
-        for q_data in questions_data:
-            question = Question(
-                q_data['id'],
-                passage_id,
-                q_data['type'],
-                q_data['question'],
-                q_data['options'],
-                q_data['answer'],
-                q_data['explanation']
-            )
-            questions.append(question)
-        return questions
+        bundle = default_bundle()
+        if bundle is not None:
+            questions_data = bundle.questions_for_passage(passage_id)
+        else:
+            questions_data = cls.QUESTIONS.get(passage_id, [])
+        return [cls._build_question(passage_id, q_data) for q_data in questions_data]
+
+    @classmethod
+    def get_question_by_id(cls, question_id):
+        """Get a specific question by ID, or None if it does not exist"""
+        bundle = default_bundle()
+        if bundle is not None:
+            entry = bundle.question(question_id)
+            return cls._build_question(*entry) if entry else None
+
+        if cls._QUESTION_INDEX is None:
+            cls._QUESTION_INDEX = {
+                q_data['id']: (passage_id, q_data)
+                for passage_id, questions_data in cls.QUESTIONS.items()
+                for q_data in questions_data
+            }
+
+        entry = cls._QUESTION_INDEX.get(question_id)
+        return cls._build_question(*entry) if entry else None
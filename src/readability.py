@@ -0,0 +1,224 @@
+"""
+Readability metrics for passages, checked against DifficultyLevel ranges
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+from difficulty_levels import DifficultyLevel
+from progress_storage import atomic_write_json
+
+# Bump when the metrics change, so cached results are recomputed
+METRICS_VERSION = 1
+
+CACHE_FILE = '.readability.json'
+
+WORD_PATTERN = re.compile(r"[A-Za-z]+(?:['’][A-Za-z]+)*")
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"'”’)]*(?=\s|$)")
+VOWEL_GROUP_PATTERN = re.compile(r'[aeiouy]+')
+
+# Flesch-Kincaid grade range expected of each DifficultyLevel complexity
+FK_GRADE_RANGES = {
+    'very_simple': (None, 2.5),
+    'simple': (None, 3.5),
+    'basic': (0.5, 4.5),
+    'intermediate': (1.5, 6.0),
+    'advanced': (2.5, 8.0),
+    'very_advanced': (3.5, 10.0),
+}
+
+# Dolch sight words (pre-primer to grade 3, plus the nouns); any other
+# word counts as rare
+COMMON_WORDS = frozenset("""
+a and away big blue can come down find for funny go help here i in is it jump
+little look make me my not one play red run said see the three to two up we
+where yellow you all am are at ate be black brown but came did do eat four get
+good have he into like must new no now on our out please pretty ran ride saw
+say she so soon that there they this too under want was well went what white
+who will with yes after again an any as ask by could every fly from give going
+had has her him his how just know let live may of old once open over put round
+some stop take thank them then think walk were when always around because been
+before best both buy call cold does don't fast first five found gave goes green
+its made many off or pull read right sing sit sleep tell their these those upon
+us use very wash which why wish work would write your about better bring carry
+clean cut done draw drink eight fall far full got grow hold hot hurt if keep
+kind laugh light long much myself never only own pick seven shall show six
+small start ten today together try warm apple baby back ball bear bed bell
+bird birthday boat box boy bread brother cake car cat chair chicken children
+christmas coat corn cow day dog doll door duck egg eye farm farmer father feet
+fire fish floor flower game garden girl goodbye grass ground hand head hill
+home horse house kitty leg letter man men milk money morning mother name nest
+night paper party picture pig rabbit rain ring robin santa school seed sheep
+shoe sister snow song squirrel stick street sun table thing time top toy tree
+watch water way wind window wood
+""".split())
+
+_SUFFIXES = ('ies', 'es', 's', 'ed', 'ing', 'er', 'est', 'ly')
+
+
+@lru_cache(maxsize=65536)
+def count_syllables(word):
+    """Estimate the syllables of one lowercase word"""
+    count = len(VOWEL_GROUP_PATTERN.findall(word))
+    if word.endswith('e') and not word.endswith(('le', 'ee', 'ye')) and count > 1:
+        count -= 1
+    return max(count, 1)
+
+
+@lru_cache(maxsize=65536)
+def _is_common(word):
+    """Check a lowercase word, or its stem, against COMMON_WORDS"""
+    if word in COMMON_WORDS:
+        return True
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) > len(suffix) + 2:
+            stem = word[:-len(suffix)]
+            if stem in COMMON_WORDS or stem + 'e' in COMMON_WORDS or (
+                    suffix == 'ies' and stem + 'y' in COMMON_WORDS) or (
+                    len(stem) > 2 and stem[-1] == stem[-2] and stem[:-1] in COMMON_WORDS):
+                return True
+    return False
+
+
+def text_metrics(text):
+    """
+    Compute the readability metrics of one text
+
+    Syllables and rarity are worked out once per distinct word and
+    memoized across texts, which is what keeps scoring a large corpus fast.
+
+    Returns:
+        Dict with words, sentences, syllables, fk_grade (Flesch-Kincaid
+        grade level), type_token_ratio and rare_word_density
+    """
+    words = Counter(word.lower().replace('’', "'") for word in WORD_PATTERN.findall(text))
+    word_count = sum(words.values())
+    sentences = max(len(SENTENCE_END_PATTERN.findall(text)), 1 if word_count else 0)
+    syllables = sum(count_syllables(word) * n for word, n in words.items())
+    rare = sum(n for word, n in words.items() if not _is_common(word.partition("'")[0]))
+
+    if not word_count:
+        return {'words': 0, 'sentences': 0, 'syllables': 0, 'fk_grade': 0.0,
+                'type_token_ratio': 0.0, 'rare_word_density': 0.0}
+    fk_grade = 0.39 * word_count / sentences + 11.8 * syllables / word_count - 15.59
+    return {
+        'words': word_count,
+        'sentences': sentences,
+        'syllables': syllables,
+        'fk_grade': round(fk_grade, 2),
+        'type_token_ratio': round(len(words) / word_count, 4),
+        'rare_word_density': round(rare / word_count, 4)
+    }
+
+
+def check_metrics(metrics, grade):
+    """
+    Compare a passage's metrics with its grade's DifficultyLevel
+
+    Returns:
+        List of problems found, empty if the passage fits its grade
+    """
+    level = DifficultyLevel.get_level_info(str(grade))
+    if level is None:
+        return [f"unknown grade {grade!r}"]
+
+    issues = []
+    low, high = level['word_count_range']
+    if metrics['words'] < low:
+        issues.append(f"{metrics['words']} words, below {low}-{high}")
+    elif metrics['words'] > high:
+        issues.append(f"{metrics['words']} words, above {low}-{high}")
+
+    fk_low, fk_high = FK_GRADE_RANGES.get(level['complexity'], (None, None))
+    if fk_low is not None and metrics['fk_grade'] < fk_low:
+        issues.append(f"reading level {metrics['fk_grade']}, too simple for "
+                      f"{level['complexity']} (at least {fk_low})")
+    if fk_high is not None and metrics['fk_grade'] > fk_high:
+        issues.append(f"reading level {metrics['fk_grade']}, too hard for "
+                      f"{level['complexity']} (at most {fk_high})")
+    return issues
+
+
+class ReadabilityCache:
+    """Metrics keyed by content hash, so only changed text is rescored"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.metrics = {}
+        self._used = set()
+        self.computed = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == METRICS_VERSION:
+                    self.metrics = data.get('metrics', {})
+            except (OSError, ValueError):
+                # Unreadable: score every text again
+                pass
+
+    def get(self, text):
+        """Get the metrics of a text, computing them if not cached"""
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        self._used.add(key)
+        metrics = self.metrics.get(key)
+        if metrics is None:
+            metrics = self.metrics[key] = text_metrics(text)
+            self.computed += 1
+        return metrics
+
+    def save(self):
+        """Write the metrics of the texts scored this run; no-op without a path"""
+        if not self.path:
+            return
+        metrics = {key: value for key, value in self.metrics.items() if key in self._used}
+        try:
+            atomic_write_json(self.path, {'version': METRICS_VERSION, 'metrics': metrics},
+                              separators=(',', ':'))
+        except OSError:
+            # A read-only corpus just goes uncached
+            pass
+
+
+def score_passages(passages, cache=None):
+    """
+    Score passages and check each against its grade
+
+    Args:
+        passages: Iterable of (record, text), record having id, title and grade
+        cache: ReadabilityCache to reuse metrics from (none if None)
+
+    Returns:
+        List of dicts with id, title, grade, metrics and issues
+    """
+    cache = cache or ReadabilityCache()
+    report = []
+    for record, text in passages:
+        metrics = cache.get(text)
+        report.append({
+            'id': record['id'],
+            'title': record['title'],
+            'grade': record['grade'],
+            'metrics': metrics,
+            'issues': check_metrics(metrics, record['grade'])
+        })
+    return report
+
+
+def score_corpus(corpus):
+    """
+    Score every passage of a PassageCorpus, caching metrics in its directory
+
+    Returns:
+        Report as from score_passages
+    """
+    cache = ReadabilityCache(os.path.join(corpus.directory, CACHE_FILE))
+    report = score_passages(
+        ((record, corpus.read_text(record['id'])) for record in corpus.records), cache
+    )
+    cache.save()
+    return report
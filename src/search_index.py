@@ -0,0 +1,326 @@
+"""
+Full-text BM25 search over passages and their questions
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+
+from progress_storage import atomic_write_json
+
+# Bump when tokenize or the stored layout changes, so cached indexes are rebuilt
+INDEX_VERSION = 1
+
+INDEX_FILE = '.search_index.json'
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i in is it its
+of on or she so that the their them then there they this to was were what when
+which who will with you your
+""".split())
+
+# Each title word counts as this many occurrences in the passage text
+TITLE_WEIGHT = 3
+
+# In an index of at least COMMON_TERM_MIN_DOCS passages, terms found in
+# more than COMMON_TERM_SHARE of them add next to nothing to a ranking but
+# cost a pass over most of the index, so they are skipped unless the
+# query has no other terms
+COMMON_TERM_SHARE = 0.5
+COMMON_TERM_MIN_DOCS = 1000
+
+
+def tokenize(text):
+    """Split text into lowercase search terms, dropping stop words"""
+    terms = []
+    for word in WORD_PATTERN.findall(text.lower().replace('’', "'")):
+        word = word.partition("'")[0]
+        if word in STOP_WORDS:
+            continue
+        # Light plural folding so 'cycles' finds 'cycle'
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class SearchIndex:
+    """An inverted index over passage titles, text and question text
+
+    Each passage is one document. Postings map a term to the documents
+    containing it with their (title-weighted) term frequency; documents
+    are ranked with Okapi BM25. Passages can be added, replaced or removed
+    one at a time, so the index never needs rebuilding as content grows.
+    Only postings and metadata are kept, never the passage text.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.docs = {}
+        self._lengths = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, passage_id):
+        return passage_id in self.docs
+
+    def to_dict(self):
+        """Convert the index to a JSON-serializable dict"""
+        # Each document's terms are its postings keys, so they are not stored twice
+        docs = {passage_id: {key: value for key, value in doc.items() if key != 'terms'}
+                for passage_id, doc in self.docs.items()}
+        return {'k1': self.k1, 'b': self.b, 'docs': docs, 'postings': self.postings}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an index from to_dict output"""
+        index = cls(data['k1'], data['b'])
+        index.docs = data['docs']
+        index.postings = data['postings']
+        terms = {passage_id: [] for passage_id in index.docs}
+        for term, postings in index.postings.items():
+            for passage_id in postings:
+                terms[passage_id].append(term)
+        for passage_id, doc in index.docs.items():
+            doc['terms'] = tuple(terms[passage_id])
+        index._lengths = {passage_id: doc['length'] for passage_id, doc in index.docs.items()}
+        index._total_length = sum(index._lengths.values())
+        return index
+
+    def add_passage(self, record, text, questions=()):
+        """
+        Index one passage, replacing it if it is already indexed
+
+        Args:
+            record: Passage metadata with id, title, grade and type
+            text: Passage text
+            questions: Question texts to index with the passage
+        """
+        passage_id = record['id']
+        fingerprint = hashlib.sha1('\0'.join(
+            [record['title'], record['grade'], record['type'], text, *questions]
+        ).encode('utf-8')).hexdigest()
+        doc = self.docs.get(passage_id)
+        if doc is not None:
+            if doc['fingerprint'] == fingerprint:
+                return
+            self.remove_passage(passage_id)
+
+        frequencies = {}
+        for term in tokenize(record['title']):
+            frequencies[term] = frequencies.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(text):
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for question in questions:
+            for term in tokenize(question):
+                frequencies[term] = frequencies.get(term, 0) + 1
+
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[passage_id] = frequency
+        length = sum(frequencies.values())
+        self.docs[passage_id] = {
+            'title': record['title'],
+            'grade': record['grade'],
+            'type': record['type'],
+            'length': length,
+            'terms': tuple(frequencies),
+            'fingerprint': fingerprint
+        }
+        self._lengths[passage_id] = length
+        self._total_length += length
+
+    def remove_passage(self, passage_id):
+        """Drop a passage from the index (no-op if it is not indexed)"""
+        doc = self.docs.pop(passage_id, None)
+        if doc is None:
+            return
+        for term in doc['terms']:
+            postings = self.postings[term]
+            del postings[passage_id]
+            if not postings:
+                del self.postings[term]
+        del self._lengths[passage_id]
+        self._total_length -= doc['length']
+
+    def search(self, query, grade=None, passage_type=None, limit=10):
+        """
+        Rank passages against a query
+
+        Args:
+            query: Free text, e.g. 'water cycle'
+            grade: Only match passages of this grade
+            passage_type: Only match passages of this type
+            limit: Maximum number of results
+
+        Returns:
+            List of dicts with id, title, grade, type and score, best first
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+
+        doc_count = len(self.docs)
+        if doc_count >= COMMON_TERM_MIN_DOCS:
+            selective = {term for term in terms
+                         if len(self.postings.get(term, ())) <= COMMON_TERM_SHARE * doc_count}
+            if selective:
+                terms = selective
+        docs, lengths = self.docs, self._lengths
+        k1 = self.k1
+        # BM25 length normalization folded into one factor per document
+        base, slope = k1 * (1 - self.b), k1 * self.b * doc_count / self._total_length
+        scores = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            weight = idf * (k1 + 1)
+            get = scores.get
+            for passage_id, frequency in postings.items():
+                scores[passage_id] = get(passage_id, 0.0) + weight * frequency / (
+                    frequency + base + slope * lengths[passage_id])
+
+        if grade is not None or passage_type is not None:
+            scores = {passage_id: score for passage_id, score in scores.items()
+                      if (grade is None or docs[passage_id]['grade'] == grade)
+                      and (passage_type is None or docs[passage_id]['type'] == passage_type)}
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [
+            {
+                'id': passage_id,
+                'title': docs[passage_id]['title'],
+                'grade': docs[passage_id]['grade'],
+                'type': docs[passage_id]['type'],
+                'score': round(score, 4)
+            }
+            for passage_id, score in best
+        ]
+
+    def update_from_database(self):
+        """
+        Bring the index in line with PassageDatabase and QuestionBank
+
+        New and changed passages are (re)indexed and passages no longer in
+        the database are dropped; unchanged passages cost one hash each.
+        Text is read straight from the corpus or bundle, so it is not kept
+        on the database's cached ReadingPassage objects.
+
+        Returns:
+            Number of passages indexed or dropped
+        """
+        from questions import QuestionBank
+        from reading_passages import PassageDatabase
+
+        catalog = PassageDatabase.catalog()
+        changed = 0
+        current = set()
+        for record in catalog.records:
+            passage_id = record['id']
+            current.add(passage_id)
+            text = record.get('content')
+            if text is None:
+                text = catalog.load_content(passage_id) if catalog.load_content else ''
+            questions = [q.text for q in QuestionBank.get_questions_for_passage(passage_id)]
+            before = self.docs.get(passage_id, {}).get('fingerprint')
+            self.add_passage(record, text, questions)
+            changed += self.docs[passage_id]['fingerprint'] != before
+
+        for passage_id in [passage_id for passage_id in self.docs if passage_id not in current]:
+            self.remove_passage(passage_id)
+            changed += 1
+        return changed
+
+
+def source_key(catalog):
+    """
+    Identify the current passages and questions of a PassageCatalog
+
+    Returns:
+        The catalog's version (the bundle's content hash, or a hash of the
+        passage files' index) with the question bank's size and
+        modification time, or None if the catalog has no version
+    """
+    import questions
+
+    if catalog.version is None:
+        return None
+    st = os.stat(questions.__file__)
+    return f'{catalog.version}:{st.st_size}:{st.st_mtime_ns}'
+
+
+def read_cached_index(path):
+    """
+    Read an index saved by write_cached_index
+
+    Returns:
+        (source key, SearchIndex), or (None, None) if the file is
+        missing, unreadable or from another INDEX_VERSION
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == INDEX_VERSION:
+            return data['source'], SearchIndex.from_dict(data['index'])
+    except (OSError, ValueError, KeyError):
+        # Unreadable: the caller rebuilds the index
+        pass
+    return None, None
+
+
+def write_cached_index(path, source, index):
+    """Save an index with the source key it was built from; a read-only corpus goes uncached"""
+    try:
+        atomic_write_json(path, {'version': INDEX_VERSION, 'source': source,
+                                 'index': index.to_dict()}, separators=(',', ':'))
+    except OSError:
+        pass
+
+
+_DEFAULT = {}
+
+
+def default_index():
+    """
+    Get the index of the passage database, loaded once per process
+
+    The index is cached in INDEX_FILE in the passage directory together
+    with the catalog's source key. A cold start whose key still matches
+    loads the cache without reading any passage text; otherwise the
+    cached (or current) index is updated incrementally and saved again.
+    The same happens when the database switches to another corpus (see
+    PassageDatabase.use_corpus).
+    """
+    from reading_passages import PassageDatabase
+
+    catalog = PassageDatabase.catalog()
+    if _DEFAULT.get('catalog') is catalog:
+        return _DEFAULT['index']
+
+    source = source_key(catalog)
+    path = os.path.join(catalog.directory, INDEX_FILE) if catalog.directory else None
+    cached_source, index = read_cached_index(path) if path else (None, None)
+    if source is None or cached_source != source:
+        if index is None:
+            index = _DEFAULT.get('index')
+        if index is None:
+            index = SearchIndex()
+        index.update_from_database()
+        if path and source is not None:
+            write_cached_index(path, source, index)
+
+    _DEFAULT['index'] = index
+    _DEFAULT['catalog'] = catalog
+    return index
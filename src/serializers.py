@@ -0,0 +1,179 @@
+"""
+Serialization formats for progress files
+"""
+
+import json
+import struct
+
+from progress_schema import SCHEMA_VERSION
+
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
+try:
+    import msgpack
+    MSGPACK_SUPPORT = True
+except ImportError:
+    MSGPACK_SUPPORT = False
+
+# Files written by a serializer start with this line, e.g.
+#   #progress-log serializer=msgpack schema=2
+HEADER_PREFIX = b'#progress-log '
+
+
+class Serializer:
+    """Base class for record serializers
+
+    Each record is framed so a reader can tell a complete record from one
+    cut short by an interrupted write, and can report how many bytes each
+    record took so callers can keep file offsets.
+    """
+
+    name = None
+    available = True
+
+    def dumps(self, obj):
+        """Encode one object to bytes"""
+        raise NotImplementedError
+
+    def loads(self, data):
+        """Decode one object from bytes"""
+        raise NotImplementedError
+
+    def encode_record(self, obj):
+        """Encode one object as a framed record"""
+        return self.dumps(obj) + b'\n'
+
+    def iter_records(self, f):
+        """
+        Read framed records from a binary file
+
+        Yields:
+            (obj, size) pairs; obj is None for a complete but undecodable
+            record. Stops at the first incomplete record.
+        """
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                yield self.loads(line), len(line)
+            except ValueError:
+                yield None, len(line)
+
+    def file_header(self):
+        """Get the header line that starts every file this serializer writes"""
+        return HEADER_PREFIX + f'serializer={self.name} schema={SCHEMA_VERSION}\n'.encode()
+
+
+class JSONSerializer(Serializer):
+    """Compact JSON, one record per line (the default)"""
+
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    """orjson-encoded JSON, one record per line; several times faster"""
+
+    name = 'orjson'
+    available = ORJSON_SUPPORT
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """MessagePack records, each prefixed with its 4-byte length"""
+
+    name = 'msgpack'
+    available = MSGPACK_SUPPORT
+    LENGTH = struct.Struct('>I')
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+            raise ValueError(str(e))
+
+    def encode_record(self, obj):
+        payload = self.dumps(obj)
+        return self.LENGTH.pack(len(payload)) + payload
+
+    def iter_records(self, f):
+        while True:
+            prefix = f.read(self.LENGTH.size)
+            if len(prefix) < self.LENGTH.size:
+                return
+            (length,) = self.LENGTH.unpack(prefix)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            try:
+                yield self.loads(payload), self.LENGTH.size + length
+            except ValueError:
+                yield None, self.LENGTH.size + length
+
+
+SERIALIZERS = {
+    'json': JSONSerializer,
+    'orjson': OrjsonSerializer,
+    'msgpack': MsgpackSerializer
+}
+
+
+def get_serializer(name='json'):
+    """
+    Get a serializer by name
+
+    Args:
+        name: Key in SERIALIZERS
+
+    Returns:
+        Serializer instance
+    """
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer: {name}")
+
+    serializer = SERIALIZERS[name]()
+    if not serializer.available:
+        raise ValueError(f"Serializer '{name}' needs the {name} package (pip install {name})")
+    return serializer
+
+
+def available_serializers():
+    """Get the names of the serializers usable in this environment"""
+    return [name for name, cls in SERIALIZERS.items() if cls.available]
+
+
+def read_file_header(f):
+    """
+    Detect the serializer of a progress file
+
+    Args:
+        f: File opened in binary mode, positioned at the start
+
+    Returns:
+        (serializer, schema_version, header_size). Files written before
+        headers existed are plain JSON lines with schema version 1.
+    """
+    first = f.readline()
+    if not first.startswith(HEADER_PREFIX) or not first.endswith(b'\n'):
+        f.seek(0)
+        return JSONSerializer(), 1, 0
+
+    fields = dict(item.split('=', 1) for item in first[len(HEADER_PREFIX):].decode().split())
+    return get_serializer(fields.get('serializer', 'json')), int(fields.get('schema', 1)), len(first)
@@ -0,0 +1,184 @@
+"""
+Offline sync of progress between stores on different devices
+"""
+
+import json
+import os
+
+from file_lock import FileLock
+from progress_storage import atomic_write_json, location_id
+
+
+class SyncState:
+    """How far into one side's history each peer has already been sent
+
+    Cursors are storage positions (see iter_sessions_since), kept per peer
+    and per student in a small JSON file next to the progress data, so the
+    next sync starts where the last one stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(os.path.splitext(path)[0] + '.lock')
+        self.peers = {}
+
+    @classmethod
+    def for_store(cls, store):
+        """Get the sync state of a ProgressStore"""
+        return cls(os.path.join(store.root_dir, 'sync.json'))
+
+    @classmethod
+    def for_file(cls, data_file):
+        """Get the sync state of a single progress file"""
+        return cls(os.path.splitext(data_file)[0] + '.sync.json')
+
+    def load(self):
+        """Read the cursors; call with the lock held"""
+        self.peers = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.peers = json.load(f).get('peers', {})
+            except json.JSONDecodeError:
+                # A damaged file: send everything again
+                pass
+
+    def cursor(self, peer_id, key):
+        """Get the position from which sessions are new to a peer"""
+        return self.peers.get(peer_id, {}).get(key, 0)
+
+    def set_cursor(self, peer_id, key, position):
+        """Record how far a peer has been sent, and save the cursors"""
+        self.peers.setdefault(peer_id, {})[key] = position
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write_json(self.path, {'peers': self.peers}, indent=2)
+
+
+def _merge_order(pair):
+    """Order sessions so each origin's sequence numbers are written in order"""
+    session = pair[0]
+    return (session.get('origin', ''), session.get('seq', 0), session['date'], session.get('id') or '')
+
+
+def push_sessions(source, target, cursor=0, batch_size=500):
+    """
+    Copy the sessions a target tracker is missing from a source tracker
+
+    Only sessions the source stored at or after cursor are read. A session
+    is skipped if the target already holds its origin's sequence number;
+    sessions recorded before sessions had an origin are matched by ID.
+    What is sent is written in (origin, seq) order, so every origin's
+    sessions in the target always form an unbroken run, even after an
+    interrupted sync.
+
+    Args:
+        source: ProgressTracker to read from
+        target: ProgressTracker to write to
+        cursor: Source position to start from
+        batch_size: Sessions written per storage call
+
+    Returns:
+        (number of sessions sent, new cursor)
+    """
+    vector = target.storage.sync_vector()
+    known_ids = None
+    missing = []
+    for position, session in source.storage.iter_sessions_since(cursor):
+        cursor = position + 1
+        origin = session.get('origin')
+        if origin is not None:
+            if session['seq'] <= vector.get(origin, 0):
+                continue
+        else:
+            if known_ids is None:
+                known_ids = {s.get('id') for s in target.storage.iter_sessions()
+                             if 'origin' not in s}
+            if session.get('id') in known_ids:
+                continue
+
+        summary = {key: value for key, value in session.items()
+                   if key not in ('results', 'detail')}
+        missing.append((summary, source.storage.session_results(session) or []))
+
+    missing.sort(key=_merge_order)
+    for start in range(0, len(missing), batch_size):
+        target.record_sessions(missing[start:start + batch_size])
+    return len(missing), cursor
+
+
+def _exchange(local, remote, local_state, remote_state, local_id, remote_id, key, batch_size):
+    """Push one student's new sessions both ways and move the cursors on"""
+    sent, cursor = push_sessions(local, remote, local_state.cursor(remote_id, key), batch_size)
+    local_state.set_cursor(remote_id, key, cursor)
+    received, cursor = push_sessions(remote, local, remote_state.cursor(local_id, key), batch_size)
+    remote_state.set_cursor(local_id, key, cursor)
+    return sent, received
+
+
+def sync_stores(local, remote, students=None, batch_size=500):
+    """
+    Merge two ProgressStores so both hold every session of both
+
+    The merge is the union of the two histories, so syncing in any order
+    or more than once gives the same sessions on every device. Each run
+    reads only what was stored since the last sync between the same two
+    stores.
+
+    Args:
+        local: ProgressStore on this device
+        remote: ProgressStore to sync with, e.g. on a shared drive
+        students: Student IDs to sync (every student on either side if None)
+        batch_size: Sessions written per storage call
+
+    Returns:
+        Dict with the number of students, sessions sent and sessions received
+    """
+    local_state, remote_state = SyncState.for_store(local), SyncState.for_store(remote)
+    local_id, remote_id = location_id(local.root_dir), location_id(remote.root_dir)
+    if local_id == remote_id:
+        raise ValueError("Cannot sync a store with itself")
+
+    summary = {'students': 0, 'sent': 0, 'received': 0}
+    with local_state.lock.acquire(exclusive=True), remote_state.lock.acquire(exclusive=True):
+        local_state.load()
+        remote_state.load()
+        if students is None:
+            students = sorted(set(local.iter_student_ids()) | set(remote.iter_student_ids()))
+        for student_id in students:
+            with local.open_tracker(student_id) as local_tracker, \
+                    remote.open_tracker(student_id) as remote_tracker:
+                sent, received = _exchange(
+                    local_tracker, remote_tracker,
+                    local_state, remote_state, local_id, remote_id, student_id, batch_size
+                )
+            summary['students'] += 1
+            summary['sent'] += sent
+            summary['received'] += received
+    return summary
+
+
+def sync_trackers(local, remote, batch_size=500):
+    """
+    Merge two single-student progress files, as sync_stores does for stores
+
+    Args:
+        local: ProgressTracker on this device
+        remote: ProgressTracker to sync with
+
+    Returns:
+        Dict with the number of sessions sent and received
+    """
+    local_file, remote_file = local.storage.data_file, remote.storage.data_file
+    local_state, remote_state = SyncState.for_file(local_file), SyncState.for_file(remote_file)
+    local_id, remote_id = location_id(local_file), location_id(remote_file)
+    if local_id == remote_id:
+        raise ValueError("Cannot sync a progress file with itself")
+
+    with local_state.lock.acquire(exclusive=True), remote_state.lock.acquire(exclusive=True):
+        local_state.load()
+        remote_state.load()
+        sent, received = _exchange(local, remote, local_state, remote_state,
+                                   local_id, remote_id, local.student, batch_size)
+    return {'sent': sent, 'received': received}
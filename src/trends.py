@@ -0,0 +1,245 @@
+"""
+Time-bucketed accuracy trends over recorded reading sessions
+"""
+
+from datetime import date, datetime, timedelta
+
+
+# Bucket periods kept for every student
+PERIODS = ('day', 'week')
+
+
+def bucket_key(session_date, period):
+    """
+    Get the bucket a session date falls into
+
+    Args:
+        session_date: ISO date or datetime string, as stored on sessions
+        period: 'day' or 'week' (weeks start on Monday)
+
+    Returns:
+        ISO date of the first day of the bucket
+    """
+    day = date.fromisoformat(session_date[:10])
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    elif period != 'day':
+        raise ValueError(f"Unknown trend period: {period}")
+    return day.isoformat()
+
+
+def new_bucket():
+    """Create an empty trend bucket"""
+    return {
+        'sessions': 0,
+        'accuracy_sum': 0,
+        'questions': 0,
+        'correct': 0,
+        # grade -> [sessions, accuracy_sum]
+        'grades': {},
+        # question type -> [correct, total]
+        'types': {}
+    }
+
+
+def add_to_bucket(bucket, session, by_type):
+    """Fold one session into a trend bucket"""
+    bucket['sessions'] += 1
+    bucket['accuracy_sum'] += session['accuracy']
+    bucket['questions'] += session['total_questions']
+    bucket['correct'] += session['correct_answers']
+
+    grade = bucket['grades'].setdefault(session['grade'], [0, 0])
+    grade[0] += 1
+    grade[1] += session['accuracy']
+
+    for type_name, (correct, total) in by_type.items():
+        counts = bucket['types'].setdefault(type_name, [0, 0])
+        counts[0] += correct
+        counts[1] += total
+
+
+class TrendBuckets:
+    """Daily and weekly buckets updated as each session is recorded
+
+    Each bucket holds session and accuracy sums overall, per grade and per
+    question type, so every trend query touches one entry per day or week
+    instead of every session.
+    """
+
+    def __init__(self):
+        self.buckets = {period: {} for period in PERIODS}
+
+    def add(self, session, by_type):
+        """Fold one session into its day and week buckets"""
+        for period in PERIODS:
+            key = bucket_key(session['date'], period)
+            bucket = self.buckets[period].get(key)
+            if bucket is None:
+                bucket = self.buckets[period][key] = new_bucket()
+            add_to_bucket(bucket, session, by_type)
+
+    def get(self, period):
+        """Get a period's buckets keyed by start date"""
+        return self.buckets[period]
+
+    def to_dict(self):
+        """Get the buckets as a JSON-serializable dict"""
+        return self.buckets
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restore buckets saved with to_dict"""
+        trends = cls()
+        trends.buckets.update(data)
+        return trends
+
+
+class TrendEngine:
+    """Accuracy trends answered from a storage driver's trend buckets
+
+    Rolling-window accuracy, least-squares slope and per-grade and
+    per-question-type trends are all computed from the buckets, so each
+    query costs O(buckets) however many sessions have been recorded.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def _position(key, period):
+        """Get a bucket's position on a time axis measured in periods"""
+        ordinal = date.fromisoformat(key).toordinal()
+        return ordinal / 7 if period == 'week' else ordinal
+
+    @staticmethod
+    def _window_start(period, window, now=None):
+        """Get the key of the first bucket inside a window ending now"""
+        today = (now or datetime.now()).date()
+        days = window * 7 if period == 'week' else window
+        return bucket_key((today - timedelta(days=days - 1)).isoformat(), period)
+
+    def buckets(self, period='day', window=None, now=None):
+        """
+        Get a period's buckets in date order
+
+        Args:
+            period: 'day' or 'week'
+            window: Only include the last window periods (all if None)
+            now: End of the window (defaults to the current time)
+
+        Returns:
+            List of (bucket start date, bucket) pairs
+        """
+        buckets = sorted(self.storage.trend_buckets(period).items())
+        if window is not None:
+            start = self._window_start(period, window, now)
+            buckets = [(key, bucket) for key, bucket in buckets if key >= start]
+        return buckets
+
+    @staticmethod
+    def _slope(points):
+        """Least-squares slope of (x, y) points, or None for fewer than two"""
+        if len(points) < 2:
+            return None
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if var_x == 0:
+            return None
+        return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+    def rolling_accuracy(self, window=7, period='day', now=None):
+        """
+        Get the average session accuracy over the last window periods
+
+        Returns:
+            Average accuracy, or None if no sessions fall in the window
+        """
+        sessions = accuracy_sum = 0
+        for _, bucket in self.buckets(period, window, now):
+            sessions += bucket['sessions']
+            accuracy_sum += bucket['accuracy_sum']
+        return accuracy_sum / sessions if sessions else None
+
+    def slope(self, period='week', window=None, now=None):
+        """
+        Get how fast accuracy is changing
+
+        Returns:
+            Change in average session accuracy (percentage points) per
+            period, or None with fewer than two buckets of data
+        """
+        points = [(self._position(key, period), bucket['accuracy_sum'] / bucket['sessions'])
+                  for key, bucket in self.buckets(period, window, now)]
+        return self._slope(points)
+
+    def trend(self, period='week', window=None, now=None):
+        """
+        Summarize the accuracy trend over a window
+
+        Returns:
+            Dict with the window's accuracy, slope, number of buckets and
+            the change in accuracy the fitted line implies across them
+        """
+        buckets = self.buckets(period, window, now)
+        sessions = sum(bucket['sessions'] for _, bucket in buckets)
+        points = [(self._position(key, period), bucket['accuracy_sum'] / bucket['sessions'])
+                  for key, bucket in buckets]
+        slope = self._slope(points)
+        change = None
+        if slope is not None:
+            # Compare the fitted line's ends, kept within 0-100%
+            mean_x = sum(x for x, _ in points) / len(points)
+            mean_y = sum(y for _, y in points) / len(points)
+            first, last = (min(max(mean_y + slope * (x - mean_x), 0), 100)
+                           for x in (points[0][0], points[-1][0]))
+            change = last - first
+        return {
+            'period': period,
+            'buckets': len(buckets),
+            'sessions': sessions,
+            'accuracy': sum(bucket['accuracy_sum'] for _, bucket in buckets) / sessions
+            if sessions else None,
+            'slope': slope,
+            'change': change
+        }
+
+    def grade_trends(self, period='week', window=None, now=None):
+        """
+        Get each grade's accuracy per bucket, overall accuracy and slope
+
+        Returns:
+            Dict of grade -> {'points': [(bucket, accuracy)], 'accuracy', 'slope'}
+        """
+        series = {}
+        for key, bucket in self.buckets(period, window, now):
+            for grade, (sessions, accuracy_sum) in bucket['grades'].items():
+                series.setdefault(grade, []).append((key, sessions, accuracy_sum))
+        return {grade: self._summarize(points, period) for grade, points in series.items()}
+
+    def type_trends(self, period='week', window=None, now=None):
+        """
+        Get each question type's accuracy per bucket, overall accuracy and slope
+
+        Returns:
+            Dict of question type -> {'points': [(bucket, accuracy)], 'accuracy', 'slope'}
+        """
+        series = {}
+        for key, bucket in self.buckets(period, window, now):
+            for type_name, (correct, total) in bucket['types'].items():
+                if total:
+                    series.setdefault(type_name, []).append((key, total, correct * 100))
+        return {type_name: self._summarize(points, period)
+                for type_name, points in series.items()}
+
+    def _summarize(self, points, period):
+        """Turn (bucket, weight, weighted accuracy) points into a trend"""
+        weight = sum(w for _, w, _ in points)
+        return {
+            'points': [(key, total / w) for key, w, total in points],
+            'accuracy': sum(total for _, _, total in points) / weight,
+            'slope': self._slope([(self._position(key, period), total / w)
+                                  for key, w, total in points])
+        }